@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Агрегатор источников трансляций
+Опрашивает все включенные источники одновременно и объединяет матчи и
+каналы в пределах одного бюджета времени. Источник, не успевший к
+дедлайну, не попадает в этот ответ и не задерживает его
+"""
+
+import asyncio
+import logging
+import os
+import re
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+
+from domain_monitor import get_domain_monitor
+from parser_async import get_parser
+
+logger = logging.getLogger(__name__)
+
+# Включенные источники (через запятую) и общий бюджет времени на ответ (сек)
+ENABLED_SOURCES = [name.strip() for name in os.getenv('SOURCES', 'gooool365').split(',') if name.strip()]
+AGGREGATOR_DEADLINE = float(os.getenv('AGGREGATOR_DEADLINE', '20'))
+
+_TITLE_KEY_RE = re.compile(r'\W+')
+
+
+def _title_key(title: str) -> str:
+    """Название матча для сравнения между источниками"""
+    return _TITLE_KEY_RE.sub(' ', title.lower()).strip()
+
+
+class MatchSource(ABC):
+    """
+    Интерфейс источника матчей и трансляций
+
+    Матчи - словари {'id', 'title', 'url'} (id уникален среди всех источников),
+    ссылки - словари {'type', 'title', 'url', 'source'} как у GoooolExtractor
+    """
+
+    name = 'base'
+
+    def owns(self, url: str) -> bool:
+        """Принадлежит ли URL матча этому источнику"""
+        return False
+
+    @abstractmethod
+    async def get_matches(self, trace=None) -> List[Dict]:
+        """Список матчей источника"""
+
+    @abstractmethod
+    async def get_links(self, match_url: str, title: str, trace=None, on_progress=None,
+                        budget: Optional[float] = None, on_late=None) -> List[Dict]:
+        """
+        Ссылки на трансляции матча
+
+        Args:
+            match_url: URL матча (может принадлежать другому источнику)
+            title: Название матча для поиска в других источниках
+            trace: ScrapeTrace для замеров
+            on_progress: Функция(links) для уже подтвержденных ссылок
+            budget: Сколько секунд вызывающий ждет ссылки (None - без ограничения)
+            on_late: Функция(links) для полного списка, если часть проверок
+                дозавершилась в фоне после возврата
+        """
+
+
+class GoooolSource(MatchSource):
+    """gooool365 через асинхронный движок парсера"""
+
+    name = 'gooool365'
+
+    def owns(self, url: str) -> bool:
+        return get_domain_monitor().domain_for(url) is not None
+
+    async def get_matches(self, trace=None) -> List[Dict]:
+        return await get_parser().get_matches(trace)
+
+    async def get_links(self, match_url: str, title: str, trace=None, on_progress=None,
+                        budget: Optional[float] = None, on_late=None) -> List[Dict]:
+        # Поиск чужих матчей по названию gooool365 не поддерживает
+        if not self.owns(match_url):
+            return []
+        return await get_parser().get_links(match_url, trace, on_progress, budget, on_late)
+
+
+# Известные адаптеры по имени
+SOURCES = {
+    GoooolSource.name: GoooolSource,
+}
+
+
+class Aggregator:
+    """Параллельный опрос источников с общим дедлайном"""
+
+    def __init__(self, sources: List[MatchSource], deadline: float = AGGREGATOR_DEADLINE):
+        """
+        Args:
+            sources: Источники в порядке приоритета при слиянии
+            deadline: Бюджет времени на ответ в секундах
+        """
+        self.sources = sources
+        self.deadline = deadline
+
+    async def _gather(self, calls: Dict[str, object]) -> Dict[str, List]:
+        """
+        Выполнить вызовы источников одновременно
+
+        Returns:
+            Результаты успевших источников: имя -> результат
+        """
+        tasks = {asyncio.create_task(coro): name for name, coro in calls.items()}
+        if not tasks:
+            return {}
+        done, pending = await asyncio.wait(tasks, timeout=self.deadline)
+        for task in pending:
+            task.cancel()
+            logger.warning(f"⏱️ Источник {tasks[task]} не успел за {self.deadline}s, пропускаем")
+
+        results = {}
+        for task in done:
+            if task.exception() is not None:
+                logger.error(f"❌ Ошибка источника {tasks[task]}: {task.exception()}")
+                continue
+            results[tasks[task]] = task.result()
+        return results
+
+    async def get_matches(self, trace=None) -> List[Dict]:
+        """
+        Матчи всех источников без повторов
+
+        Повтором считается тот же URL, а совпадение названия - только
+        у разных источников: в одном источнике два матча с одинаковым
+        названием (например повторная трансляция) остаются оба
+        """
+        results = await self._gather({source.name: source.get_matches(trace) for source in self.sources})
+
+        merged = []
+        seen_urls = set()
+        # Название -> источник, который первым его добавил
+        title_providers = {}
+        for source in self.sources:
+            for match in results.get(source.name) or []:
+                key = _title_key(match.get('title', ''))
+                if match.get('url') in seen_urls or title_providers.get(key, source.name) != source.name:
+                    continue
+                seen_urls.add(match.get('url'))
+                title_providers.setdefault(key, source.name)
+                merged.append(dict(match, provider=source.name))
+        return merged
+
+    def _merge_links(self, results: Dict[str, List]) -> List[Dict]:
+        """Ссылки источников в порядке приоритета без повторов URL"""
+        merged = []
+        seen_urls = set()
+        for source in self.sources:
+            for link in results.get(source.name) or []:
+                if not link.get('url') or link['url'] in seen_urls:
+                    continue
+                seen_urls.add(link['url'])
+                merged.append(dict(link, provider=source.name))
+        return merged
+
+    async def get_links(self, match_url: str, title: str = '', trace=None, on_progress=None,
+                        budget: Optional[float] = None, on_late=None) -> List[Dict]:
+        """
+        Ссылки матча из всех источников без повторов URL
+
+        Args:
+            on_progress: Функция(links), получает объединенные промежуточные
+                результаты источников по мере подтверждения ссылок
+            budget: Сколько секунд вызывающий ждет ссылки (см. MatchSource)
+            on_late: Функция(links), получает объединенный список, когда
+                источник дозавершил проверки в фоне
+        """
+        partial = {}
+        # Списки источников, дополненные в фоне; до возврата входят в результат
+        late = {}
+        results = None
+
+        def progress_for(source):
+            if on_progress is None:
+                return None
+
+            def report(links):
+                partial[source.name] = links
+                on_progress(self._merge_links(partial))
+            return report
+
+        def late_for(source):
+            if on_late is None:
+                return None
+
+            def report(links):
+                late[source.name] = links
+                if results is not None:
+                    on_late(self._merge_links({**results, **late}))
+            return report
+
+        results = await self._gather({
+            source.name: source.get_links(match_url, title, trace, progress_for(source), budget, late_for(source))
+            for source in self.sources
+        })
+        return self._merge_links({**results, **late})
+
+
+# Глобальный агрегатор
+_aggregator = None
+
+def get_aggregator() -> Aggregator:
+    """Получить агрегатор включенных источников"""
+    global _aggregator
+    if _aggregator is None:
+        sources = [SOURCES[name]() for name in ENABLED_SOURCES if name in SOURCES]
+        unknown = [name for name in ENABLED_SOURCES if name not in SOURCES]
+        if unknown:
+            logger.warning(f"⚠️ Неизвестные источники: {', '.join(unknown)}")
+        _aggregator = Aggregator(sources)
+        logger.info(f"🔀 Источники: {', '.join(source.name for source in sources)}")
+    return _aggregator
+
+async def get_matches(trace=None) -> List[Dict]:
+    """Матчи всех источников"""
+    return await get_aggregator().get_matches(trace)
+
+def _links_dict(links: List[Dict]) -> Dict[str, str]:
+    """
+    Ссылки в виде словаря название -> url (повторные названия
+    получают номер: "Канал", "Канал (2)", "Канал (3)")
+    """
+    links_dict = {}
+    for i, link in enumerate(links):
+        title = link.get('title') or f'Channel {i+1}'
+        name, number = title, 1
+        while name in links_dict:
+            number += 1
+            name = f'{title} ({number})'
+        links_dict[name] = link['url']
+    return links_dict
+
+async def get_match_links(match_url: str, title: str = '', trace=None, on_progress=None,
+                          budget: Optional[float] = None, on_late=None) -> Dict[str, str]:
+    """
+    Каналы матча из всех источников
+
+    Args:
+        on_progress: Функция(links_dict) для промежуточных результатов
+        budget: Сколько секунд ждать ссылки (None - без ограничения)
+        on_late: Функция(links_dict) для полного списка после проверок,
+            дозавершенных в фоне
+
+    Returns:
+        Словарь название -> url
+    """
+    report = (lambda links: on_progress(_links_dict(links))) if on_progress else None
+    late = (lambda links: on_late(_links_dict(links))) if on_late else None
+    return _links_dict(await get_aggregator().get_links(match_url, title, trace, report, budget, late))
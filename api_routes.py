@@ -0,0 +1,430 @@
+"""
+Обработчики REST API, общие для WSGI (Flask) и ASGI (Quart) серверов
+Каждый обработчик возвращает (тело ответа, HTTP статус, заголовки), сервер
+только сериализует ответ, поэтому маршруты и формат ответов в обоих режимах
+одинаковы
+
+Ответы из снимков кэшируются по HTTP: строгий ETag из версии и времени
+снимка, Cache-Control с max-age до устаревания снимка и
+stale-while-revalidate на время его фонового обновления. Их тело
+сериализуется и сжимается один раз на версию снимка (EncodedBody)
+"""
+
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from crawler import get_crawler, MATCHES_TTL, CHANNELS_TTL, CHANNELS_BUDGET
+from sentry_config import capture_exception
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Сколько закодированных ответов держать в памяти процесса и с какого
+# размера (байт) сжимать ответ
+ENCODED_CACHE_SIZE = int(os.getenv('API_ENCODED_CACHE_SIZE', '512'))
+COMPRESS_MIN_SIZE = 1000
+# Сколько матчей можно запросить в одном пакетном запросе каналов
+BATCH_LIMIT = int(os.getenv('API_BATCH_LIMIT', '50'))
+
+NO_STORE = {'Cache-Control': 'no-store'}
+
+
+class EncodedBody:
+    """
+    Тело ответа в JSON и его сжатые варианты
+
+    Сжатие выполняется при первом запросе варианта и дальше отдается готовым
+    """
+
+    __slots__ = ('variants',)
+
+    def __init__(self, body: Dict):
+        data = json.dumps(body, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        self.variants = {'identity': data}
+
+    def __len__(self):
+        return len(self.variants['identity'])
+
+    def get(self, encoding: str) -> bytes:
+        """Тело в кодировке encoding ('identity', 'gzip' или 'br')"""
+        data = self.variants.get(encoding)
+        if data is None:
+            identity = self.variants['identity']
+            if encoding == 'br':
+                data = brotli.compress(identity, quality=11)
+            else:
+                data = gzip.compress(identity, compresslevel=9, mtime=0)
+            self.variants[encoding] = data
+        return data
+
+
+Response = Tuple[Union[Dict, EncodedBody], int, Dict]
+
+# Закодированные тела по ETag; в WSGI обработчики идут из разных потоков,
+# поэтому порядок LRU меняется только под блокировкой
+_encoded: 'OrderedDict[str, EncodedBody]' = OrderedDict()
+_encoded_lock = threading.Lock()
+
+
+def encoded_body(headers: Dict, build: Callable[[], Dict]) -> Union[Dict, EncodedBody]:
+    """
+    Тело ответа, закодированное один раз на ETag
+
+    Args:
+        headers: Заголовки ответа (без ETag ответ не кэшируется)
+        build: Функция, строящая тело ответа
+    """
+    etag = headers.get('ETag')
+    if etag is None:
+        return build()
+    with _encoded_lock:
+        body = _encoded.get(etag)
+        if body is not None:
+            _encoded.move_to_end(etag)
+            return body
+    # Кодируем вне блокировки: одновременные промахи по одному ETag
+    # дают одинаковые тела, в кэше остается одно
+    body = EncodedBody(build())
+    with _encoded_lock:
+        body = _encoded.setdefault(etag, body)
+        _encoded.move_to_end(etag)
+        while len(_encoded) > ENCODED_CACHE_SIZE:
+            _encoded.popitem(last=False)
+    return body
+
+
+def _accepted_encoding(accept_encoding: Optional[str]) -> str:
+    """Лучшее сжатие из Accept-Encoding: br, gzip или identity"""
+    accepted = {}
+    for item in (accept_encoding or '').split(','):
+        name, _, params = item.partition(';')
+        params = params.strip()
+        quality = 1.0
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    wildcard = accepted.get('*', 0.0)
+    for encoding in ('br', 'gzip'):
+        if encoding == 'br' and brotli is None:
+            continue
+        if accepted.get(encoding, wildcard) > 0:
+            return encoding
+    return 'identity'
+
+
+def cache_headers(tag: str, version: Optional[int], updated_at: Optional[float], stale: bool,
+                  ttl: int) -> Dict:
+    """
+    Заголовки кэширования ответа из снимка
+
+    Args:
+        tag: Вид ответа (тело зависит от него помимо снимка)
+        version: Версия последнего изменения данных снимка
+        updated_at: Время снимка (None - снимка нет)
+        stale: Устарел ли снимок
+        ttl: Через сколько секунд снимок устаревает
+    """
+    if updated_at is None:
+        return dict(NO_STORE)
+    # Тело ответа содержит updated_at и stale, поэтому они входят в ETag
+    etag = f'"{tag}-{version or 0}-{int(updated_at * 1000)}{"-stale" if stale else ""}"'
+    max_age = 0 if stale else max(0, int(ttl - (time.time() - updated_at)))
+    return {
+        'ETag': etag,
+        'Cache-Control': f'public, max-age={max_age}, stale-while-revalidate={ttl}'
+    }
+
+
+def not_modified(headers: Dict, if_none_match: Optional[str]) -> bool:
+    """Совпадает ли ETag ответа с If-None-Match запроса (ответ 304)"""
+    etag = headers.get('ETag')
+    if not etag or not if_none_match:
+        return False
+    tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+    return '*' in tags or etag in tags
+
+
+def encode(result: Response, accept_encoding: Optional[str], if_none_match: Optional[str]) -> Tuple[bytes, int, Dict]:
+    """
+    Готовый HTTP ответ из результата обработчика
+
+    Выбирает сжатие по Accept-Encoding (у каждого варианта свой ETag)
+    и отвечает 304, если клиенту уже известен этот вариант
+
+    Returns:
+        (тело в байтах, HTTP статус, заголовки)
+    """
+    body, status, headers = result
+    if not isinstance(body, EncodedBody):
+        body = EncodedBody(body)
+    headers = dict(headers)
+    encoding = _accepted_encoding(accept_encoding) if len(body) >= COMPRESS_MIN_SIZE else 'identity'
+    if 'ETag' in headers:
+        headers['Vary'] = 'Accept-Encoding'
+        if encoding != 'identity':
+            headers['ETag'] = f'{headers["ETag"][:-1]}-{encoding}"'
+    if status == 200 and not_modified(headers, if_none_match):
+        return b'', 304, headers
+    if encoding != 'identity':
+        headers['Content-Encoding'] = encoding
+    return body.get(encoding), status, headers
+
+
+def _channel_list(links: Dict[str, str]) -> List[Dict]:
+    """Каналы снимка (название -> url) в формате для Frontend"""
+    result_channels = []
+    for idx, (title, url) in enumerate(links.items()):
+        result_channels.append({
+            'id': idx,
+            'title': title or f'Канал {idx + 1}',
+            'url': url,
+            'type': 'acestream' if url.startswith('acestream://') else 'web'
+        })
+    return result_channels
+
+
+def health() -> Response:
+    """Проверка здоровья API"""
+    return {
+        'status': 'OK',
+        'success': True,
+        'version': '1.0.0'
+    }, 200, dict(NO_STORE)
+
+
+async def matches() -> Response:
+    """Все матчи текущего снимка"""
+    try:
+        logger.info("📺 Запрос: GET /api/matches")
+        index = await get_crawler().get_index()
+
+        headers = cache_headers('matches', index.version, index.updated_at, index.stale, MATCHES_TTL)
+
+        def build():
+            # ID матча - newsid gooool365, стабилен между обновлениями
+            result = index.to_list()
+            return {
+                'success': True,
+                'data': result,
+                'count': len(result),
+                'stale': index.stale,
+                'updated_at': index.updated_at,
+                'version': index.version
+            }
+
+        logger.info(f"✅ Возвращаем {len(index)} матчей")
+        return encoded_body(headers, build), 200, headers
+    except Exception as e:
+        logger.error(f"❌ Ошибка в /api/matches: {e}")
+        capture_exception(e, {'context': 'api_matches'})
+        return {
+            'success': False,
+            'error': 'Failed to fetch matches',
+            'data': [],
+            'count': 0
+        }, 500, dict(NO_STORE)
+
+
+async def match(match_id: int) -> Response:
+    """Матч по ID"""
+    try:
+        logger.info(f"📺 Запрос: GET /api/match/{match_id}")
+        index = await get_crawler().get_index()
+        record = index.get(match_id)
+
+        if record is None:
+            return {
+                'success': False,
+                'error': 'Match not found',
+                'data': None
+            }, 404, dict(NO_STORE)
+
+        logger.info(f"✅ Возвращаем матч {match_id}")
+        headers = cache_headers(f'match{match_id}', index.version, index.updated_at, index.stale, MATCHES_TTL)
+        return encoded_body(headers, lambda: {
+            'success': True,
+            'data': record.to_dict()
+        }), 200, headers
+    except Exception as e:
+        logger.error(f"❌ Ошибка в /api/match/{match_id}: {e}")
+        capture_exception(e, {'context': f'api_get_match_{match_id}'})
+        return {
+            'success': False,
+            'error': 'Failed to fetch match',
+            'data': None
+        }, 500, dict(NO_STORE)
+
+
+async def channels(match_id: int, with_trace: bool = False) -> Response:
+    """
+    Каналы матча
+
+    Args:
+        match_id: ID матча (newsid)
+        with_trace: Добавить замеры этапов парсера, которым получен снимок
+    """
+    try:
+        logger.info(f"🔗 Запрос: GET /api/channels/{match_id}")
+        crawler = get_crawler()
+        record = (await crawler.get_index()).get(match_id)
+
+        if record is None:
+            return {
+                'success': False,
+                'error': 'Match not found',
+                'data': []
+            }, 404, dict(NO_STORE)
+
+        # Каналы матча (словарь название -> url) из снимка
+        snapshot = await crawler.get_channels(record)
+        links = snapshot['data']
+
+        def build():
+            result = {
+                'success': True,
+                'data': _channel_list(links),
+                'stale': snapshot['stale'],
+                'complete': snapshot['complete'],
+                'updated_at': snapshot['updated_at']
+            }
+            if with_trace:
+                result['trace'] = snapshot.get('meta', {}).get('trace')
+            return result
+
+        logger.info(f"✅ Найдено {len(links)} каналов для матча {match_id}")
+        if not snapshot['complete']:
+            # Частичный ответ: каналы еще проверяются
+            return build(), 200, dict(NO_STORE)
+        tag = f'channels{match_id}' + ('-trace' if with_trace else '')
+        headers = cache_headers(tag, snapshot.get('version'), snapshot['updated_at'], snapshot['stale'], CHANNELS_TTL)
+        return encoded_body(headers, build), 200, headers
+    except Exception as e:
+        logger.error(f"❌ Ошибка в /api/channels/{match_id}: {e}")
+        capture_exception(e, {'context': f'api_get_channels_{match_id}'})
+        return {
+            'success': False,
+            'error': 'Failed to fetch channels',
+            'data': []
+        }, 500, dict(NO_STORE)
+
+
+async def channels_batch(ids: str) -> Response:
+    """
+    Каналы нескольких матчей за один запрос
+
+    Матчи со снимком отдаются сразу, остальные загружаются одновременно
+    в пределах общего бюджета CHANNELS_BUDGET
+
+    Args:
+        ids: ID матчей через запятую (не больше BATCH_LIMIT)
+
+    Returns:
+        Статус каждого матча в порядке запроса: ok, partial (часть ссылок
+        еще проверяется), not_found или error
+    """
+    try:
+        # Разбираем не больше BATCH_LIMIT + 1 элементов: длинный список
+        # отклоняется без разбора целиком
+        parts = ids.split(',', BATCH_LIMIT)
+        try:
+            match_ids = list(dict.fromkeys(int(match_id) for match_id in parts if match_id.strip()))
+        except ValueError:
+            match_ids = None
+        if not match_ids or len(parts) > BATCH_LIMIT:
+            return {
+                'success': False,
+                'error': f'Expected 1-{BATCH_LIMIT} comma-separated match ids',
+                'data': []
+            }, 400, dict(NO_STORE)
+
+        logger.info(f"🔗 Запрос: GET /api/channels?ids= ({len(match_ids)} матчей)")
+        crawler = get_crawler()
+        index = await crawler.get_index()
+        records = [index.get(match_id) for match_id in match_ids]
+        snapshots = await crawler.get_channels_batch([record for record in records if record is not None])
+
+        result = []
+        for match_id, record in zip(match_ids, records):
+            snapshot = snapshots.get(match_id) if record is not None else None
+            if record is None:
+                result.append({'match_id': match_id, 'status': 'not_found', 'data': []})
+            elif isinstance(snapshot, Exception):
+                logger.error(f"❌ Ошибка загрузки каналов матча {match_id}: {snapshot}")
+                capture_exception(snapshot, {'context': f'api_channels_batch_{match_id}'})
+                result.append({'match_id': match_id, 'status': 'error', 'data': []})
+            else:
+                result.append({
+                    'match_id': match_id,
+                    'status': 'ok' if snapshot['complete'] else 'partial',
+                    'data': _channel_list(snapshot['data']),
+                    'stale': snapshot['stale'],
+                    'complete': snapshot['complete'],
+                    'updated_at': snapshot['updated_at']
+                })
+
+        logger.info(f"✅ Каналы {len(match_ids)} матчей за один запрос")
+        return {
+            'success': True,
+            'data': result,
+            'count': len(result),
+            'budget': CHANNELS_BUDGET
+        }, 200, dict(NO_STORE)
+    except Exception as e:
+        logger.error(f"❌ Ошибка в /api/channels?ids=: {e}")
+        capture_exception(e, {'context': 'api_channels_batch'})
+        return {
+            'success': False,
+            'error': 'Failed to fetch channels',
+            'data': []
+        }, 500, dict(NO_STORE)
+
+
+def events(since: int, limit: int) -> Response:
+    """События изменений матчей и каналов после версии since (не больше 500)"""
+    try:
+        result = get_crawler().events_since(since, min(limit, 500))
+        return {
+            'success': True,
+            'data': result['events'],
+            'version': result['version'],
+            'reset': result['reset']
+        }, 200, dict(NO_STORE)
+    except Exception as e:
+        logger.error(f"❌ Ошибка в /api/events: {e}")
+        capture_exception(e, {'context': 'api_events'})
+        return {
+            'success': False,
+            'error': 'Failed to fetch events',
+            'data': []
+        }, 500, dict(NO_STORE)
+
+
+def not_found() -> Response:
+    """Ответ на неизвестный маршрут"""
+    return {
+        'success': False,
+        'error': 'Not found'
+    }, 404, dict(NO_STORE)
+
+
+def internal_error(error) -> Response:
+    """Ответ на необработанную ошибку"""
+    logger.error(f"❌ Internal server error: {error}")
+    capture_exception(error)
+    return {
+        'success': False,
+        'error': 'Internal server error'
+    }, 500, dict(NO_STORE)
@@ -1,20 +1,25 @@
 """
 API сервер для Web App плеера
 Предоставляет данные о матчах и каналах через REST API
+
+WSGI режим (Flask + gunicorn): обработчики ждут результат фонового event
+loop парсера, занимая поток воркера. Асинхронный режим с теми же маршрутами -
+api_server_asgi.py
 """
 
-from flask import Flask, jsonify, request
+from flask import Flask, Response, request
 from flask_cors import CORS
 import logging
-import asyncio
 import sys
-import time
-import os
 sys.path.insert(0, '/home/ubuntu/futlive-player-v2')
 
-from parser_async import get_matches, get_match_links
-from sentry_config import init_sentry, capture_exception
+from parser_async import run_sync, submit
+from crawler import get_crawler
+import api_routes
+from sentry_config import init_sentry
 from prometheus_flask_exporter import PrometheusMetrics
+from prometheus_flask_exporter.multiprocess import GunicornInternalPrometheusMetrics
+from prometheus_config import is_multiprocess
 
 app = Flask(__name__)
 CORS(app)
@@ -22,8 +27,9 @@ CORS(app)
 # Инициализация Sentry
 init_sentry()
 
-# Инициализация Prometheus метрик
-metrics = PrometheusMetrics(app)
+# Инициализация Prometheus метрик: с PROMETHEUS_MULTIPROC_DIR /metrics
+# отдает сумму по всем воркерам gunicorn и боту
+metrics = GunicornInternalPrometheusMetrics(app) if is_multiprocess() else PrometheusMetrics(app)
 metrics.info('futlive_app_info', 'FutLive Player API', version='1.0.0')
 
 # Настройка логирования
@@ -33,184 +39,63 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Кэш данных
-matches_cache = {}
-cache_timestamp = 0
-CACHE_DURATION = 300  # 5 минут
-
-def get_cached_matches():
-    """Получить матчи с кэшированием"""
-    global matches_cache, cache_timestamp
-    
-    current_time = time.time()
-    if matches_cache and (current_time - cache_timestamp) < CACHE_DURATION:
-        logger.info(f"📦 Возвращаем кэшированные матчи ({len(matches_cache)} шт)")
-        return matches_cache
-    
-    try:
-        logger.info("🔄 Загрузка матчей из парсера...")
-        
-        # Создаем новый event loop для этого потока
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        try:
-            matches = loop.run_until_complete(get_matches())
-        finally:
-            loop.close()
-        
-        matches_cache = matches
-        cache_timestamp = current_time
-        logger.info(f"✅ Загружено {len(matches)} матчей")
-        return matches
-    except Exception as e:
-        logger.error(f"❌ Ошибка при загрузке матчей: {e}")
-        capture_exception(e, {'context': 'get_cached_matches'})
-        return []
+# Фоновый обход: снимки обновляются заранее, запросы отдают последний удачный
+crawler = get_crawler()
+submit(crawler.run())
+
+def respond(result):
+    """
+    Ответ Flask из (тело, статус, заголовки) общего обработчика
+
+    Тело уже сериализовано и сжато под Accept-Encoding (см. api_routes.encode)
+    """
+    data, status, headers = api_routes.encode(
+        result, request.headers.get('Accept-Encoding'), request.headers.get('If-None-Match')
+    )
+    return Response(data, status, headers, mimetype='application/json')
 
 @app.route('/api/health', methods=['GET'])
 def health():
     """Проверка здоровья API"""
-    return jsonify({
-        'status': 'OK',
-        'success': True,
-        'version': '1.0.0'
-    })
+    return respond(api_routes.health())
 
 @app.route('/api/matches', methods=['GET'])
 def api_matches():
     """Получить все матчи"""
-    try:
-        logger.info("📺 Запрос: GET /api/matches")
-        matches = get_cached_matches()
-        
-        # Преобразуем в формат для API
-        result = []
-        for idx, match in enumerate(matches):
-            result.append({
-                'id': idx,
-                'title': match.get('title', 'Unknown'),
-                'url': match.get('url', ''),
-            })
-        
-        logger.info(f"✅ Возвращаем {len(result)} матчей")
-        return jsonify({
-            'success': True,
-            'data': result,
-            'count': len(result)
-        })
-    except Exception as e:
-        logger.error(f"❌ Ошибка в /api/matches: {e}")
-        capture_exception(e, {'context': 'api_matches'})
-        return jsonify({
-            'success': False,
-            'error': 'Failed to fetch matches',
-            'data': [],
-            'count': 0
-        }), 500
+    return respond(run_sync(api_routes.matches()))
 
 @app.route('/api/match/<int:match_id>', methods=['GET'])
 def api_get_match(match_id):
     """Получить матч по ID (для Frontend)"""
-    try:
-        logger.info(f"📺 Запрос: GET /api/match/{match_id}")
-        matches = get_cached_matches()
-        
-        if match_id >= len(matches):
-            return jsonify({
-                'success': False,
-                'error': 'Match not found',
-                'data': None
-            }), 404
-        
-        match = matches[match_id]
-        result = {
-            'id': match_id,
-            'title': match.get('title', 'Unknown'),
-            'url': match.get('url', ''),
-        }
-        
-        logger.info(f"✅ Возвращаем матч {match_id}")
-        return jsonify({
-            'success': True,
-            'data': result
-        })
-    except Exception as e:
-        logger.error(f"❌ Ошибка в /api/match/{match_id}: {e}")
-        capture_exception(e, {'context': f'api_get_match_{match_id}'})
-        return jsonify({
-            'success': False,
-            'error': 'Failed to fetch match',
-            'data': None
-        }), 500
+    return respond(run_sync(api_routes.match(match_id)))
 
 @app.route('/api/channels/<int:match_id>', methods=['GET'])
 def api_get_channels(match_id):
     """Получить каналы для конкретного матча (для Frontend)"""
-    try:
-        logger.info(f"🔗 Запрос: GET /api/channels/{match_id}")
-        matches = get_cached_matches()
-        
-        if match_id >= len(matches):
-            return jsonify({
-                'success': False,
-                'error': 'Match not found',
-                'data': []
-            }), 404
-        
-        match = matches[match_id]
-        match_url = match.get('url', '')
-        
-        # Получаем каналы для матча
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        try:
-            links = loop.run_until_complete(get_match_links(match_url))
-        finally:
-            loop.close()
-        
-        # Преобразуем в формат для Frontend
-        channels = []
-        for idx, link in enumerate(links):
-            channels.append({
-                'id': idx,
-                'title': link.get('title', f'Канал {idx + 1}'),
-                'url': link.get('url', ''),
-                'type': 'acestream' if link.get('url', '').startswith('acestream://') else 'web'
-            })
-        
-        logger.info(f"✅ Найдено {len(channels)} каналов для матча {match_id}")
-        return jsonify({
-            'success': True,
-            'data': channels
-        })
-    except Exception as e:
-        logger.error(f"❌ Ошибка в /api/channels/{match_id}: {e}")
-        capture_exception(e, {'context': f'api_get_channels_{match_id}'})
-        return jsonify({
-            'success': False,
-            'error': 'Failed to fetch channels',
-            'data': []
-        }), 500
+    # Замеры этапов парсера, которым получен снимок (?trace=1)
+    return respond(run_sync(api_routes.channels(match_id, request.args.get('trace') == '1')))
+
+@app.route('/api/channels', methods=['GET'])
+def api_get_channels_batch():
+    """Получить каналы нескольких матчей (?ids=1,2,3)"""
+    return respond(run_sync(api_routes.channels_batch(request.args.get('ids', ''))))
+
+@app.route('/api/events', methods=['GET'])
+def api_events():
+    """События изменений матчей и каналов после версии since"""
+    since = request.args.get('since', 0, type=int)
+    limit = request.args.get('limit', 100, type=int)
+    return respond(api_routes.events(since, limit))
 
 @app.errorhandler(404)
 def not_found(error):
     """Обработка 404 ошибок"""
-    return jsonify({
-        'success': False,
-        'error': 'Not found'
-    }), 404
+    return respond(api_routes.not_found())
 
 @app.errorhandler(500)
 def internal_error(error):
     """Обработка 500 ошибок"""
-    logger.error(f"❌ Internal server error: {error}")
-    capture_exception(error)
-    return jsonify({
-        'success': False,
-        'error': 'Internal server error'
-    }), 500
+    return respond(api_routes.internal_error(error))
 
 if __name__ == '__main__':
     logger.info("🚀 Запуск API сервера...")
@@ -0,0 +1,180 @@
+"""
+API сервер для Web App плеера в асинхронном режиме (ASGI, Quart + uvicorn)
+Те же маршруты и ответы, что у api_server.py, но обработчики ждут парсер
+прямо в event loop сервера: медленный запрос каналов не занимает воркер,
+и тысячи одновременных запросов обслуживает один процесс
+
+Только в этом режиме есть поток событий /api/stream (Server-Sent Events):
+открытое подключение в WSGI занимало бы воркер целиком
+
+Запуск:
+    uvicorn api_server_asgi:app --host 0.0.0.0 --port 5000
+"""
+
+import asyncio
+import logging
+import os
+import time
+
+from prometheus_client import Gauge, Histogram
+from quart import Quart, Response, g, request
+from quart_cors import cors
+from sentry_sdk.integrations.quart import QuartIntegration
+
+import api_routes
+from crawler import get_crawler
+from event_stream import get_event_hub
+from parser_async import get_parser
+from prometheus_config import mark_process_dead, render_metrics
+from sentry_config import init_sentry
+
+app = cors(Quart(__name__))
+
+# Инициализация Sentry
+init_sentry([QuartIntegration()])
+
+# Prometheus метрики (в WSGI режиме их собирает prometheus_flask_exporter).
+# Info не поддерживается в multiprocess режиме, поэтому версия - gauge
+APP_INFO = Gauge('futlive_app_info', 'FutLive Player API', ['version'], multiprocess_mode='max')
+APP_INFO.labels('1.0.0').set(1)
+REQUEST_SECONDS = Histogram(
+    'futlive_http_request_duration_seconds', 'Длительность запросов API',
+    ['method', 'path', 'status']
+)
+
+# Настройка логирования
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+def respond(result):
+    """
+    Ответ Quart из (тело, статус, заголовки) общего обработчика
+
+    Тело уже сериализовано и сжато под Accept-Encoding (см. api_routes.encode)
+    """
+    data, status, headers = api_routes.encode(
+        result, request.headers.get('Accept-Encoding'), request.headers.get('If-None-Match')
+    )
+    return Response(data, status=status, headers=headers, content_type='application/json')
+
+
+@app.before_serving
+async def start_crawler():
+    """Фоновый обход в event loop сервера"""
+    app.crawler_task = asyncio.ensure_future(get_crawler().run())
+
+
+@app.after_serving
+async def stop_crawler():
+    """Остановить обход и закрыть соединения парсера"""
+    get_crawler().stop()
+    app.crawler_task.cancel()
+    await get_parser().close()
+    mark_process_dead()
+
+
+@app.before_request
+async def start_timer():
+    g.started = time.perf_counter()
+
+
+@app.after_request
+async def record_request(response):
+    rule = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    REQUEST_SECONDS.labels(request.method, rule, response.status_code).observe(time.perf_counter() - g.started)
+    return response
+
+
+@app.route('/metrics', methods=['GET'])
+async def metrics():
+    """Метрики Prometheus (всех процессов в multiprocess режиме)"""
+    data, content_type = render_metrics()
+    return Response(data, content_type=content_type)
+
+
+@app.route('/api/health', methods=['GET'])
+async def health():
+    """Проверка здоровья API"""
+    return respond(api_routes.health())
+
+
+@app.route('/api/matches', methods=['GET'])
+async def api_matches():
+    """Получить все матчи"""
+    return respond(await api_routes.matches())
+
+
+@app.route('/api/match/<int:match_id>', methods=['GET'])
+async def api_get_match(match_id):
+    """Получить матч по ID (для Frontend)"""
+    return respond(await api_routes.match(match_id))
+
+
+@app.route('/api/channels/<int:match_id>', methods=['GET'])
+async def api_get_channels(match_id):
+    """Получить каналы для конкретного матча (для Frontend)"""
+    # Замеры этапов парсера, которым получен снимок (?trace=1)
+    return respond(await api_routes.channels(match_id, request.args.get('trace') == '1'))
+
+
+@app.route('/api/channels', methods=['GET'])
+async def api_get_channels_batch():
+    """Получить каналы нескольких матчей (?ids=1,2,3)"""
+    return respond(await api_routes.channels_batch(request.args.get('ids', '')))
+
+
+@app.route('/api/stream', methods=['GET'])
+async def api_stream():
+    """
+    Поток событий изменений матчей и каналов (Server-Sent Events)
+
+    ?since=<версия> или заголовок Last-Event-ID - дослать пропущенные события,
+    ?matches=1,2 - изменения каналов только этих матчей
+    """
+    since = request.headers.get('Last-Event-ID') or request.args.get('since')
+    match_ids = request.args.get('matches')
+    try:
+        since = int(since) if since else None
+        match_ids = {int(match_id) for match_id in match_ids.split(',') if match_id.strip()} if match_ids else None
+    except ValueError:
+        return respond(({'success': False, 'error': 'Invalid since or matches'}, 400, dict(api_routes.NO_STORE)))
+
+    response = Response(
+        get_event_hub().stream(since, match_ids),
+        content_type='text/event-stream',
+        # X-Accel-Buffering: nginx отдает события сразу, без буфера
+        headers={'Cache-Control': 'no-store', 'X-Accel-Buffering': 'no'}
+    )
+    response.timeout = None
+    return response
+
+
+@app.route('/api/events', methods=['GET'])
+async def api_events():
+    """События изменений матчей и каналов после версии since"""
+    since = request.args.get('since', 0, type=int)
+    limit = request.args.get('limit', 100, type=int)
+    return respond(await asyncio.to_thread(api_routes.events, since, limit))
+
+
+@app.errorhandler(404)
+async def not_found(error):
+    """Обработка 404 ошибок"""
+    return respond(api_routes.not_found())
+
+
+@app.errorhandler(500)
+async def internal_error(error):
+    """Обработка 500 ошибок"""
+    return respond(api_routes.internal_error(error))
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    logger.info("🚀 Запуск API сервера (ASGI)...")
+    uvicorn.run(app, host='0.0.0.0', port=int(os.getenv('API_PORT', '5000')))
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк выдачи /api/matches и /api/channels на один воркер
+
+Запросы идут по настоящему пути: обходчик, снимок в Redis (REDIS_HOST,
+отдельная база REDIS_BENCH_DB, рабочие снимки не затрагиваются; без Redis -
+локальный кэш), ETag и EncodedBody. Сравнивается чтение снимка с разбором
+JSON на каждый запрос (память процесса очищается) и проверка одной метки
+снимка с разобранным снимком из памяти. Для сравнения с прежней выдачей
+тот же снимок отдается через jsonify на каждый запрос (и gzip, как в nginx)
+
+Запуск:
+    python3 bench_api.py          # 60 матчей в снимке
+    python3 bench_api.py 200      # 200 матчей
+"""
+
+import asyncio
+import gzip
+import logging
+import os
+import sys
+import time
+
+from flask import Flask, jsonify
+
+import api_routes
+from crawler import get_crawler
+from redis_cache import RedisCache
+
+REQUESTS = 5000
+
+
+def make_matches(matches):
+    return [
+        {'id': 1000 + i, 'title': f'{18 + i % 5}:00 Команда {i} - Команда {i + 1}',
+         'url': f'https://gooool365.org/online/{1000 + i}-team{i}-vs-team{i + 1}.html'}
+        for i in range(matches)
+    ]
+
+
+def make_channels(match_id):
+    channels = {f'Ace Stream {i}': f'acestream://{match_id:08d}{i:032x}' for i in range(8)}
+    channels.update({f'Плеер {i}': f'https://player{i}.example/embed/{match_id}' for i in range(8)})
+    return channels
+
+
+async def _rate(handler):
+    """Запросов в секунду для handler"""
+    started = time.perf_counter()
+    for _ in range(REQUESTS):
+        size = len(await handler())
+    return REQUESTS / (time.perf_counter() - started), size
+
+
+async def main():
+    matches = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    logging.disable(logging.INFO)
+    cache = RedisCache(
+        host=os.getenv('REDIS_HOST', 'localhost'),
+        port=int(os.getenv('REDIS_PORT', '6379')),
+        db=int(os.getenv('REDIS_BENCH_DB', '15')),
+        password=os.getenv('REDIS_PASSWORD') or None
+    )
+    crawler = get_crawler()
+    crawler.cache = cache
+    data = make_matches(matches)
+    match_id = data[0]['id']
+    cache.set_snapshot('matches', data, event=('matches', {'added': data}))
+    cache.set_channels_snapshot(match_id, make_channels(match_id), meta={'complete': True},
+                                event=('channels', {'match_id': match_id}))
+
+    def handler(route, accept_encoding, if_none_match=None, memo=True):
+        async def run():
+            if not memo:
+                # Как до метки снимка: GET, json.loads и реестр на каждый запрос
+                cache._snapshots.clear()
+                cache._channel_views.clear()
+            return api_routes.encode(await route(), accept_encoding, if_none_match)[0]
+        return run
+
+    app = Flask(__name__)
+
+    async def legacy(compress):
+        # Прежний обработчик: список и jsonify на каждый запрос, gzip в nginx
+        index = await crawler.get_index()
+        result = index.to_list()
+        with app.app_context():
+            body = jsonify({
+                'success': True,
+                'data': result,
+                'count': len(result),
+                'stale': index.stale,
+                'updated_at': index.updated_at,
+                'version': index.version
+            }).get_data()
+        return gzip.compress(body, compresslevel=1) if compress else body
+
+    channels = lambda: api_routes.channels(match_id)
+    matches_etag = api_routes.encode(await api_routes.matches(), 'gzip', None)[2]['ETag']
+    channels_etag = api_routes.encode(await channels(), 'gzip', None)[2]['ETag']
+    cases = [
+        ('matches: jsonify', lambda: legacy(False)),
+        ('matches: jsonify + gzip nginx', lambda: legacy(True)),
+        ('matches: без памяти, gzip', handler(api_routes.matches, 'gzip', memo=False)),
+        ('matches: без памяти, 304', handler(api_routes.matches, 'gzip', matches_etag, memo=False)),
+        ('matches: identity', handler(api_routes.matches, None)),
+        ('matches: gzip', handler(api_routes.matches, 'gzip')),
+        ('matches: br', handler(api_routes.matches, 'gzip, br')),
+        ('matches: 304', handler(api_routes.matches, 'gzip', matches_etag)),
+        ('channels: без памяти, 304', handler(channels, 'gzip', channels_etag, memo=False)),
+        ('channels: gzip', handler(channels, 'gzip')),
+        ('channels: 304', handler(channels, 'gzip', channels_etag)),
+    ]
+
+    backend = 'Redis' if cache.is_connected() else 'локальный кэш'
+    print(f"Снимки: {backend}, матчей: {matches}, запросов на замер: {REQUESTS}\n")
+    print(f"{'Режим':<32}{'запросов/с':>12}{'байт':>10}")
+    for name, run in cases:
+        rate, size = await _rate(run)
+        print(f"{name:<32}{rate:>12.0f}{size:>10}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк разбора HTML в event loop и в пуле процессов
+
+Для каждого уровня конкурентности параллельно разбираются главная
+страница и ответы /player/, как при одновременных запросах к API.
+Кроме пропускной способности замеряется задержка event loop: пока
+разбор идет в loop, все остальные запросы воркера стоят
+
+Запуск:
+    python3 bench_parse_pool.py                  # пул из числа ядер
+    python3 bench_parse_pool.py 4                # пул из 4 процессов
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+import parser_async
+from bench_parser import make_home_page, make_player_page
+from scrape_trace import ScrapeTrace
+
+CONCURRENCY_LEVELS = [1, 4, 16, 64]
+JOBS = 128
+
+
+async def _loop_lag(stop, interval=0.01):
+    """Максимальная задержка тиков event loop (мс)"""
+    loop = asyncio.get_running_loop()
+    worst = 0.0
+    while not stop.is_set():
+        started = loop.time()
+        await asyncio.sleep(interval)
+        worst = max(worst, loop.time() - started - interval)
+    return worst * 1000
+
+
+async def _run(parser, pages, concurrency):
+    queue = asyncio.Queue()
+    for i in range(JOBS):
+        queue.put_nowait(pages[i % len(pages)])
+
+    async def worker():
+        while not queue.empty():
+            kind, body = queue.get_nowait()
+            await parser._extract(kind, body, ScrapeTrace('bench'), 'parse')
+
+    stop = asyncio.Event()
+    lag = asyncio.create_task(_loop_lag(stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    return JOBS / elapsed, await lag
+
+
+async def main():
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else (os.cpu_count() or 2)
+    pages = [('matches', make_home_page().encode()), ('player', make_player_page().encode())]
+    parser = parser_async.AsyncGoooolParser.__new__(parser_async.AsyncGoooolParser)
+    parser_async.GoooolExtractor.__init__(parser)
+
+    print(f"Заданий на уровень: {JOBS}, процессов в пуле: {workers}\n")
+    print(f"{'Режим':<12}{'Конкурентность':>16}{'страниц/с':>12}{'макс. задержка loop, мс':>26}")
+    for mode, pool_size in (('event loop', 0), ('пул', workers)):
+        parser_async.PARSE_WORKERS = pool_size
+        if pool_size:
+            # Прогрев: запуск процессов не входит в замер
+            await asyncio.gather(*(parser._extract(*pages[0], ScrapeTrace('bench'), 'parse') for _ in range(pool_size)))
+        for concurrency in CONCURRENCY_LEVELS:
+            rate, lag = await _run(parser, pages, concurrency)
+            print(f"{mode:<12}{concurrency:>16}{rate:>12.1f}{lag:>26.1f}")
+
+    pool = parser_async.get_parse_pool()
+    if pool is not None:
+        pool.shutdown()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Микробенчмарк разбора страниц gooool365
+
+Сравнивает прежний разбор (BeautifulSoup html.parser + отдельные
+regex-проходы) с однопроходным разбором на lxml из parser.py
+
+Запуск:
+    python3 bench_parser.py                  # синтетические страницы
+    python3 bench_parser.py home.html match.html player.html
+"""
+
+import re
+import sys
+import timeit
+
+from bs4 import BeautifulSoup
+
+from parser import GoooolExtractor, IFRAME_BLOCKLIST, EXTERNAL_BLOCKLIST, PLAYER_PATTERNS
+
+BASE_URL = GoooolExtractor.BASE_URLS[0]
+
+
+# ============ ПРЕЖНИЙ РАЗБОР ============
+
+def _legacy_absolute(url):
+    if url.startswith('//'):
+        return 'https:' + url
+    if url.startswith('/'):
+        return BASE_URL + url
+    return url
+
+def legacy_parse_matches(html):
+    soup = BeautifulSoup(html, 'html.parser')
+    matches = []
+    seen_urls = set()
+    for link in soup.find_all('a', href=re.compile(r'/online/\d+')):
+        title = link.get_text(strip=True)
+        url = link.get('href')
+        if not url:
+            continue
+        if not url.startswith('http'):
+            url = BASE_URL + url
+        if title and url not in seen_urls and re.search(r'/online/\d+-', url):
+            matches.append({'title': title, 'url': url})
+            seen_urls.add(url)
+    return matches
+
+def legacy_parse_match_page(html):
+    BeautifulSoup(html, 'html.parser').find('h1')
+
+    candidates = []
+    iframes = re.findall(r'<iframe[^>]+src=["\']([^"\']+)["\'][^>]*>', html, re.IGNORECASE)
+    for i, src in enumerate(iframes):
+        if any(x in src.lower() for x in IFRAME_BLOCKLIST):
+            continue
+        candidates.append({'type': 'web', 'title': f'Трансляция {i+1}', 'url': _legacy_absolute(src), 'source': 'iframe'})
+
+    video_vars = re.findall(r'videoid\d+\s*=\s*[\'"](.*?)[\'"]', html, re.DOTALL)
+    for i, video_html in enumerate(video_vars):
+        src_match = re.search(r'src=["\'](.*?)["\']', video_html)
+        if src_match:
+            candidates.append({'type': 'web', 'title': f'Канал {i+1}', 'url': _legacy_absolute(src_match.group(1)), 'source': 'script'})
+
+    external = []
+    for pattern in PLAYER_PATTERNS:
+        urls = [url for url in re.findall(pattern, html, re.IGNORECASE)
+                if not any(x in url.lower() for x in EXTERNAL_BLOCKLIST)]
+        if urls:
+            external.append({'type': 'web', 'source': 'external', 'alternatives': urls})
+    return candidates, external
+
+def legacy_parse_player(html):
+    re.findall(r'acestream://([a-f0-9]{40})', html)
+    soup = BeautifulSoup(html, 'html.parser')
+    links = [{'title': tag.get_text(strip=True) or 'Ace Stream', 'url': tag.get('href')}
+             for tag in soup.find_all('a', href=re.compile(r'acestream://'))]
+    iframes = re.findall(r'<iframe[^>]+src=["\']([^"\']+)["\'][^>]*>', html, re.IGNORECASE)
+    return links, iframes
+
+
+# ============ СИНТЕТИЧЕСКИЕ СТРАНИЦЫ ============
+
+def _filler(n):
+    return ''.join(
+        f'<div class="news-item"><p>Новость {i}: обзор тура, статистика и составы команд.</p>'
+        f'<img src="/uploads/img{i}.jpg" alt="img"><a href="/news/{i}-obzor.html">Читать</a></div>\n'
+        for i in range(n)
+    )
+
+def make_home_page(matches=60):
+    items = ''.join(
+        f'<li><a href="/online/{1000 + i}-team{i}-vs-team{i + 1}.html">'
+        f'<span class="time">{18 + i % 5}:00</span> <b>Команда {i}</b> - <b>Команда {i + 1}</b></a></li>\n'
+        for i in range(matches)
+    )
+    return f'<html><head><title>gooool365</title></head><body><ul class="matches">{items}</ul>{_filler(400)}</body></html>'
+
+def make_match_page():
+    scripts = ''.join(
+        f"var videoid{i} = '<iframe src=\"//player{i}.example.tv/embed/{i}\" allowfullscreen></iframe>';\n"
+        for i in range(6)
+    )
+    iframes = ''.join(
+        f'<iframe src="https://stream{i}.example.com/live/{i}" width="640"></iframe>\n'
+        for i in range(4)
+    )
+    return (
+        '<html><head><title>Матч</title>'
+        '<script src="https://mc.yandex.ru/metrika/tag.js"></script></head><body>'
+        '<h1>Команда 1 - Команда 2</h1>'
+        f'{iframes}<iframe src="https://www.google.com/maps/embed"></iframe>'
+        f'<script>{scripts}</script>'
+        '<a href="https://cdn.example.net/player.php?id=5">Плеер</a>'
+        '<a href="https://other.example.org/stream/hd">HD</a>'
+        f'{_filler(300)}</body></html>'
+    )
+
+def make_player_page():
+    links = ''.join(
+        f'<a href="acestream://{i:040x}">Ace Stream HD {i}</a><br>\n' for i in range(8)
+    )
+    return f'<div class="player">{links}<iframe src="//extra.example.tv/embed/1"></iframe></div>'
+
+
+# ============ ЗАМЕР ============
+
+def _measure(func, html, number):
+    best = min(timeit.repeat(lambda: func(html), number=number, repeat=5))
+    return best / number * 1000
+
+def main():
+    if len(sys.argv) == 4:
+        pages = [open(path, encoding='utf-8', errors='replace').read() for path in sys.argv[1:]]
+    else:
+        pages = [make_home_page(), make_match_page(), make_player_page()]
+    home, match, player = pages
+
+    extractor = GoooolExtractor()
+
+    # Результаты должны совпадать
+    assert legacy_parse_matches(home) == [
+        {'title': m['title'], 'url': m['url']} for m in extractor._parse_matches(home)
+    ]
+    assert legacy_parse_match_page(match) == extractor._parse_match_page(match)
+
+    cases = [
+        ('Главная страница', home, legacy_parse_matches, extractor._parse_matches, 20),
+        ('Страница матча', match, legacy_parse_match_page, extractor._parse_match_page, 20),
+        ('Ответ /player/', player, legacy_parse_player, extractor._parse_player_html, 200),
+    ]
+
+    print(f"{'Страница':<20}{'Размер, КБ':>12}{'до, мс':>10}{'после, мс':>12}{'ускорение':>12}")
+    for name, html, before, after, number in cases:
+        before_ms = _measure(before, html, number)
+        after_ms = _measure(after, html, number)
+        print(f"{name:<20}{len(html) / 1024:>12.1f}{before_ms:>10.2f}{after_ms:>12.2f}{before_ms / after_ms:>11.1f}x")
+
+if __name__ == "__main__":
+    main()
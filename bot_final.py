@@ -16,8 +16,10 @@ from aiogram.fsm.state import State, StatesGroup
 import sys
 sys.path.insert(0, '/home/ubuntu/futlive-player-v2')
 
-from parser_async import get_matches
 from redis_cache import get_cache
+from crawler import get_crawler
+from match_index import MatchIndex
+from prometheus_config import mark_process_dead
 
 # Настройка логирования
 logging.basicConfig(
@@ -33,34 +35,20 @@ dp = Dispatcher()
 
 # Инициализация сервисов
 cache = get_cache()
+crawler = get_crawler()
 
 # Состояния FSM
 class MatchSelection(StatesGroup):
     waiting_for_match = State()
     loading_channels = State()
 
-async def get_cached_matches():
-    """Получить матчи с Redis кэшированием"""
+async def get_match_index():
+    """Индекс матчей по стабильному ID (newsid) для текущего снимка"""
     try:
-        # Сначала проверяем кэш
-        cached = cache.get_matches()
-        if cached:
-            logger.info(f"📦 Матчи получены из кэша ({len(cached)} шт)")
-            return cached
-        
-        # Если кэша нет, загружаем из парсера
-        logger.info("🔄 Загрузка матчей из gooool365.org...")
-        matches = await get_matches()
-        
-        # Сохраняем в кэш
-        if matches:
-            cache.set_matches(matches, ttl=300)  # 5 минут
-            logger.info(f"✅ Загружено {len(matches)} матчей")
-        
-        return matches
+        return await crawler.get_index()
     except Exception as e:
         logger.error(f"❌ Ошибка при получении матчей: {e}")
-        return []
+        return MatchIndex([], stale=True)
 
 @dp.message(Command("start"))
 async def start_command(message: types.Message, state: FSMContext):
@@ -92,9 +80,9 @@ async def show_matches(callback: types.CallbackQuery, state: FSMContext):
     loading_msg = await callback.message.answer("⏳ Загружаю матчи...")
     
     try:
-        matches = await get_cached_matches()
+        index = await get_match_index()
         
-        if not matches:
+        if not index:
             await loading_msg.edit_text(
                 "❌ Матчи не найдены. Попробуйте позже.",
                 reply_markup=InlineKeyboardMarkup(inline_keyboard=[
@@ -105,9 +93,10 @@ async def show_matches(callback: types.CallbackQuery, state: FSMContext):
         
         # Создаем клавиатуру с матчами (максимум 10)
         keyboard_buttons = []
-        for i, match in enumerate(matches[:10]):
-            match_name = match.get('name', 'Unknown')[:30]  # Ограничиваем длину
-            callback_data = f"match_{i}"
+        for match in list(index)[:10]:
+            match_name = match.title[:30]  # Ограничиваем длину
+            # ID матча стабилен, кнопка остается верной после обновления списка
+            callback_data = f"match_{match.id}"
             keyboard_buttons.append([
                 InlineKeyboardButton(text=f"⚽ {match_name}", callback_data=callback_data)
             ])
@@ -119,16 +108,15 @@ async def show_matches(callback: types.CallbackQuery, state: FSMContext):
         keyboard = InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
         
         text = (
-            f"📋 <b>Найдено {len(matches)} матчей</b>\n\n"
+            f"📋 <b>Найдено {len(index)} матчей</b>\n\n"
             "Выберите матч для просмотра трансляции:"
         )
+        if index.stale:
+            text += "\n\n<i>⚠️ Список может быть устаревшим, обновляется...</i>"
         
         await loading_msg.edit_text(text, reply_markup=keyboard, parse_mode="HTML")
         await state.set_state(MatchSelection.waiting_for_match)
         
-        # Сохраняем матчи в контекст
-        await state.update_data(matches=matches)
-        
     except Exception as e:
         logger.error(f"❌ Ошибка при загрузке матчей: {e}")
         await loading_msg.edit_text(
@@ -144,20 +132,16 @@ async def show_match_streams(callback: types.CallbackQuery, state: FSMContext):
     await callback.answer()
     
     try:
-        # Получаем индекс матча
-        match_index = int(callback.data.split("_")[1])
+        # Получаем ID матча
+        match_id = int(callback.data.split("_")[1])
         
-        # Получаем матчи из контекста
-        data = await state.get_data()
-        matches = data.get('matches', [])
+        match = (await get_match_index()).get(match_id)
         
-        if match_index >= len(matches):
+        if match is None:
             await callback.message.answer("❌ Матч не найден")
             return
         
-        match = matches[match_index]
-        match_name = match.get('name', 'Unknown')
-        match_time = match.get('time', 'Unknown')
+        match_name = match.title
         
         # Формируем ссылку на livetv.sx для поиска матча
         search_query = match_name.replace(' - ', ' ').replace(' ', '+')
@@ -165,8 +149,7 @@ async def show_match_streams(callback: types.CallbackQuery, state: FSMContext):
         
         text = (
             f"📺 <b>Трансляция</b>\n\n"
-            f"⚽ <b>{match_name}</b>\n"
-            f"⏰ <b>{match_time}</b>\n\n"
+            f"⚽ <b>{match_name}</b>\n\n"
             f"<i>Нажмите кнопку ниже для поиска трансляции на livetv.sx</i>"
         )
         
@@ -244,12 +227,18 @@ async def main():
     logger.info("🤖 Запуск FutLive Bot...")
     logger.info(f"📡 API Token: {API_TOKEN[:20]}...")
     
+    # Фоновый обход (работает только в процессе, владеющем блокировкой)
+    crawler_task = asyncio.create_task(crawler.run())
+    
     try:
         await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
     except Exception as e:
         logger.error(f"❌ Ошибка при запуске бота: {e}")
     finally:
+        crawler.stop()
+        crawler_task.cancel()
         await bot.session.close()
+        mark_process_dead()
 
 if __name__ == "__main__":
     asyncio.run(main())
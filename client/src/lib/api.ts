@@ -16,6 +16,24 @@ export interface Channel {
   type: 'web' | 'acestream';
 }
 
+export interface ChannelsBatchEntry {
+  match_id: number;
+  // ok - полный список, partial - часть ссылок еще проверяется
+  status: 'ok' | 'partial' | 'not_found' | 'error';
+  data: Channel[];
+  stale?: boolean;
+  complete?: boolean;
+  updated_at?: number;
+}
+
+export interface UpdateEvent {
+  version: number;
+  // reset - часть событий пропущена, нужно перечитать матчи и каналы
+  type: 'matches' | 'channels' | 'reset';
+  ts?: number;
+  data: Record<string, unknown>;
+}
+
 export interface ApiResponse<T> {
   success: boolean;
   data?: T;
@@ -174,6 +192,40 @@ export async function getChannels(matchId: number): Promise<ApiResponse<Channel[
   }
 }
 
+/**
+ * Получить каналы нескольких матчей одним запросом
+ * Сервер загружает недостающие матчи одновременно в пределах общего бюджета
+ */
+export async function getChannelsBatch(matchIds: number[]): Promise<ApiResponse<ChannelsBatchEntry[]>> {
+  try {
+    const response = await fetchWithRetry(`${API_BASE_URL}/channels?ids=${matchIds.join(',')}`);
+
+    if (!response.ok) {
+      throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+    }
+
+    const data = await response.json();
+
+    if (!data.success) {
+      return {
+        success: false,
+        error: data.error || 'Не удалось получить каналы',
+      };
+    }
+
+    return {
+      success: true,
+      data: data.data || [],
+    };
+  } catch (error) {
+    console.error(`Error fetching channels for matches ${matchIds.join(',')}:`, error);
+    return {
+      success: false,
+      error: `Ошибка при получении каналов: ${error}`,
+    };
+  }
+}
+
 /**
  * Получить конкретный канал
  */
@@ -277,6 +329,90 @@ export async function clearCache(): Promise<ApiResponse<void>> {
   }
 }
 
+// Интервал опроса /events, если сервер не поддерживает поток событий
+const EVENTS_POLL_INTERVAL = 15000;
+
+/**
+ * Подписаться на изменения матчей и каналов
+ * Использует поток событий /stream (EventSource переподключается сам
+ * и досылает пропущенное по Last-Event-ID), без него - опрос /events
+ *
+ * @param onEvent - Обработчик события
+ * @param matchIds - Изменения каналов только этих матчей (по умолчанию всех)
+ * @returns Функция для отписки
+ */
+export function subscribeToUpdates(
+  onEvent: (event: UpdateEvent) => void,
+  matchIds?: number[]
+): () => void {
+  // Последняя известная версия (null - еще не получена)
+  let version: number | null = null;
+  let closed = false;
+  let pollTimer: ReturnType<typeof setTimeout> | undefined;
+  const handle = (event: UpdateEvent) => {
+    version = event.version;
+    onEvent(event);
+  };
+
+  const poll = async () => {
+    try {
+      // Без версии нужна только текущая версия, а не вся история событий
+      const query = version === null ? 'since=0&limit=1' : `since=${version}`;
+      const response = await fetchWithRetry(`${API_BASE_URL}/events?${query}`);
+      const data = await response.json();
+      if (data.success) {
+        if (version === null) {
+          // Первый ответ - точка отсчета: снимки клиент уже загрузил сам
+          version = data.version as number;
+        } else if (data.reset) {
+          handle({ version: data.version, type: 'reset', data: {} });
+        } else {
+          (data.data as UpdateEvent[]).forEach(event => {
+            if (event.type !== 'channels' || !matchIds?.length
+              || matchIds.includes(event.data.match_id as number)) {
+              handle(event);
+            }
+            version = event.version;
+          });
+        }
+      }
+    } catch (error) {
+      console.error('Error polling events:', error);
+    }
+    if (!closed) {
+      pollTimer = setTimeout(poll, EVENTS_POLL_INTERVAL);
+    }
+  };
+
+  if (typeof EventSource === 'undefined') {
+    poll();
+    return () => {
+      closed = true;
+      clearTimeout(pollTimer);
+    };
+  }
+
+  const params = matchIds?.length ? `?matches=${matchIds.join(',')}` : '';
+  const source = new EventSource(`${API_BASE_URL}/stream${params}`);
+  (['matches', 'channels', 'reset'] as const).forEach(type => {
+    source.addEventListener(type, message => {
+      handle(JSON.parse((message as MessageEvent).data));
+    });
+  });
+  source.onerror = () => {
+    // Соединение закрыто окончательно (например, сервер в режиме WSGI)
+    if (source.readyState === EventSource.CLOSED && !closed) {
+      poll();
+    }
+  };
+
+  return () => {
+    closed = true;
+    source.close();
+    clearTimeout(pollTimer);
+  };
+}
+
 /**
  * Проверить здоровье API
  */
@@ -0,0 +1,484 @@
+#!/usr/bin/env python3
+"""
+Фоновый обход gooool365
+Обновляет список матчей и каналы активных матчей заранее, до истечения TTL.
+API и бот всегда отдают последний удачный снимок сразу, а если обновление
+не удалось - продолжают отдавать его с пометкой stale
+"""
+
+import asyncio
+import logging
+import os
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+from aggregator import get_matches, get_match_links
+from redis_cache import get_cache
+from match_index import MatchIndex, MatchRecord, diff_matches, diff_channels, kickoff_time, is_live
+from scrape_trace import ScrapeTrace
+
+logger = logging.getLogger(__name__)
+
+# Через сколько секунд снимок считается устаревшим
+MATCHES_TTL = int(os.getenv('MATCHES_TTL', '300'))
+CHANNELS_TTL = int(os.getenv('CHANNELS_TTL', '300'))
+# Через сколько секунд устаревает неполный снимок каналов (часть ссылок не
+# успела пройти проверку): проверки дозавершаются в фоне и заполняют кэш
+# статусов, а следующее чтение обновляет снимок уже по кэшу
+INCOMPLETE_CHANNELS_TTL = int(os.getenv('INCOMPLETE_CHANNELS_TTL', '15'))
+# Интервал обхода (меньше TTL, чтобы обновлять заранее)
+CRAWL_INTERVAL = int(os.getenv('CRAWL_INTERVAL', '240'))
+# Каналы каких матчей обновлять: запрошенных за последние N секунд
+ACTIVE_WINDOW = int(os.getenv('ACTIVE_MATCH_WINDOW', '900'))
+# Сколько матчей обновлять одновременно
+CRAWL_CONCURRENCY = int(os.getenv('CRAWL_CONCURRENCY', '4'))
+# Сколько ждать каналы матча без снимка (сек), дальше - частичный ответ
+CHANNELS_BUDGET = float(os.getenv('CHANNELS_BUDGET', '4'))
+# Блокировка обновления снимка между процессами (сек) и интервал
+# проверки снимка, пока его обновляет другой процесс
+REFRESH_LOCK_TTL = int(os.getenv('REFRESH_LOCK_TTL', '60'))
+REFRESH_POLL_INTERVAL = 0.25
+# Предзагрузка каналов матчей, которые скоро начнутся или уже идут:
+# за сколько секунд до начала и сколько секунд после начала матч берется,
+# сколько первых матчей списка брать, если время не указано,
+# и не больше скольких матчей за обход
+PREFETCH_LEAD = int(os.getenv('PREFETCH_LEAD', '1800'))
+PREFETCH_LIVE_WINDOW = int(os.getenv('PREFETCH_LIVE_WINDOW', '7200'))
+PREFETCH_TOP = int(os.getenv('PREFETCH_TOP', '3'))
+PREFETCH_LIMIT = int(os.getenv('PREFETCH_LIMIT', '8'))
+
+
+def _with_staleness(snapshot: Optional[Dict], ttl: int) -> Optional[Dict]:
+    """Добавляет к снимку пометку stale"""
+    if snapshot is None:
+        return None
+    snapshot['stale'] = time.time() - snapshot.get('updated_at', 0) > ttl
+    return snapshot
+
+
+def _channels_view(snapshot: Optional[Dict]) -> Optional[Dict]:
+    """Снимок каналов с пометками stale и complete"""
+    if snapshot is None:
+        return None
+    complete = snapshot.get('meta', {}).get('complete', True)
+    snapshot = _with_staleness(snapshot, CHANNELS_TTL if complete else INCOMPLETE_CHANNELS_TTL)
+    snapshot['complete'] = complete
+    return snapshot
+
+
+def _prefetch_targets(index: MatchIndex, now: Optional[float] = None) -> List[MatchRecord]:
+    """
+    Матчи для предзагрузки каналов: идущие и начинающиеся в ближайшие
+    PREFETCH_LEAD секунд, ближайшие к началу первыми
+
+    Матчи без времени в названии берутся по порядку списка: сайт
+    показывает ближайшие матчи первыми
+    """
+    now = time.time() if now is None else now
+    targets = []
+    for position, match in enumerate(index):
+        if is_live(match.title):
+            targets.append((now, position, match))
+            continue
+        kickoff = kickoff_time(match.title, now)
+        if kickoff is None:
+            if position < PREFETCH_TOP:
+                targets.append((now + PREFETCH_LEAD, position, match))
+        elif now - PREFETCH_LIVE_WINDOW <= kickoff <= now + PREFETCH_LEAD:
+            targets.append((max(kickoff, now), position, match))
+    targets.sort(key=lambda target: target[:2])
+    return [match for _, _, match in targets[:PREFETCH_LIMIT]]
+
+
+def _log_task_error(task: asyncio.Task):
+    """Записать в лог ошибку фоновой задачи"""
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"❌ Ошибка фонового обновления: {task.exception()}")
+
+
+class Crawler:
+    """
+    Фоновое обновление снимков матчей и каналов
+
+    Синхронный клиент Redis вызывается из async методов через
+    asyncio.to_thread, чтобы не останавливать event loop ASGI сервера
+    """
+
+    def __init__(self, interval: int = CRAWL_INTERVAL):
+        """
+        Args:
+            interval: Интервал обхода в секундах
+        """
+        self.cache = get_cache()
+        self.interval = interval
+        self.owner = uuid.uuid4().hex
+        self.running = False
+        # Обновления в процессе: ключ снимка -> общая задача
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # Промежуточные каналы обновляемых матчей: ключ снимка -> каналы
+        self._partial: Dict[str, Dict] = {}
+        self._index = None
+
+    # ============ ОБНОВЛЕНИЕ ============
+
+    async def refresh_matches(self) -> Optional[Dict]:
+        """
+        Загрузить матчи и сохранить снимок
+
+        Returns:
+            Новый снимок или None, если загрузка не удалась
+            (прежний снимок при этом остается)
+        """
+        trace = ScrapeTrace('matches')
+        matches = await get_matches(trace)
+        if not matches:
+            logger.warning("⚠️ Обновление матчей не удалось, оставляем прежний снимок")
+            return None
+        previous = await asyncio.to_thread(self.cache.get_snapshot, 'matches')
+        change = diff_matches(previous['data'] if previous else [], matches)
+        version, event = self._change_event('matches', change, previous)
+        await asyncio.to_thread(self.cache.set_matches, matches, MATCHES_TTL)
+        snapshot = await asyncio.to_thread(
+            self.cache.set_snapshot, 'matches', matches, version, {'trace': trace.to_dict()}, event
+        )
+        return _with_staleness(snapshot, MATCHES_TTL)
+
+    async def refresh_channels(self, match: MatchRecord, budget: Optional[float] = None) -> Optional[Dict]:
+        """
+        Загрузить каналы матча и сохранить снимок
+
+        Промежуточные результаты доступны в self._partial, пока идет загрузка.
+        Если часть проверок не успела к дедлайну, они дозавершаются в фоне
+        и снимок перезаписывается полным списком (см. _save_late_channels)
+
+        Args:
+            match: Матч
+            budget: Сколько секунд ждет вызывающий (None - фоновый обход)
+
+        Returns:
+            Новый снимок или None, если каналы не найдены
+        """
+        key = f'channels:{match.id}'
+        trace = ScrapeTrace('links')
+        try:
+            links = await get_match_links(
+                match.url, match.title, trace, lambda partial: self._partial.__setitem__(key, partial),
+                budget, lambda late: asyncio.ensure_future(self._save_late_channels(match, late))
+            )
+        finally:
+            self._partial.pop(key, None)
+        if not links:
+            logger.warning(f"⚠️ Каналы не найдены для матча {match.id}, оставляем прежний снимок")
+            return None
+        # Неполный список: часть ссылок не успела пройти проверку
+        meta = {'trace': trace.to_dict(), 'complete': trace.validation['timeout'] == 0}
+        return await self._save_channels(match, links, meta)
+
+    async def _save_channels(self, match: MatchRecord, links: Dict[str, str], meta: Dict) -> Optional[Dict]:
+        """Сохранить снимок каналов вместе с событием изменения"""
+        previous = await asyncio.to_thread(self.cache.get_channels_snapshot, match.id)
+        change = diff_channels(previous['data'] if previous else {}, links)
+        if change is not None:
+            change['match_id'] = match.id
+        version, event = self._change_event('channels', change, previous)
+        snapshot = await asyncio.to_thread(self.cache.set_channels_snapshot, match.id, links, version, meta, event)
+        return _channels_view(snapshot)
+
+    async def _save_late_channels(self, match: MatchRecord, links: Dict[str, str]):
+        """
+        Перезаписать неполный снимок каналов списком после проверок,
+        дозавершенных в фоне: клиенты получают событие, не дожидаясь
+        INCOMPLETE_CHANNELS_TTL
+        """
+        key = f'channels:{match.id}'
+        try:
+            # Сначала обновление, которое сохраняет неполный снимок
+            flight = self._inflight.get(key)
+            if flight is not None:
+                await asyncio.wait({flight})
+            previous = await asyncio.to_thread(self.cache.get_channels_snapshot, match.id)
+            meta = dict(previous.get('meta', {}) if previous else {}, complete=True)
+            await self._save_channels(match, links, meta)
+            logger.info(f"✅ Каналы матча {match.id} дополнены после фоновых проверок")
+        except Exception as e:
+            logger.error(f"❌ Ошибка сохранения каналов матча {match.id}: {e}")
+
+    @staticmethod
+    def _change_event(event_type: str, change: Optional[Dict],
+                      previous: Optional[Dict]) -> Tuple[Optional[int], Optional[Tuple[str, Dict]]]:
+        """
+        Версия и событие для нового снимка
+
+        Событие публикуется вместе с записью снимка (см. RedisCache.set_snapshot):
+        клиент, получивший событие, уже читает снимок этой версии
+
+        Returns:
+            (версия прежнего снимка, None) без изменений или (None, событие)
+        """
+        if change is None:
+            return (previous.get('version') if previous else None), None
+        return None, (event_type, change)
+
+    async def _single_flight(self, key: str, refresh) -> Optional[Dict]:
+        """
+        Обновление снимка key, общее для всех одновременных вызовов
+
+        Пока обновление идет, повторные вызовы в этом процессе ждут его
+        результата, а не запускают новое. Между процессами (воркеры
+        gunicorn, бот) то же обеспечивает блокировка в Redis
+        """
+        flight = self._inflight.get(key)
+        if flight is None:
+            flight = asyncio.ensure_future(self._refresh_exclusive(key, refresh))
+            self._inflight[key] = flight
+            flight.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield: отмена одного ожидающего не отменяет общее обновление
+        return await asyncio.shield(flight)
+
+    async def _refresh_exclusive(self, key: str, refresh) -> Optional[Dict]:
+        """Обновить снимок или дождаться, пока его обновит другой процесс"""
+        lock = f'refresh:{key}'
+        started = time.time()
+        if await asyncio.to_thread(self.cache.acquire_lock, lock, self.owner, REFRESH_LOCK_TTL):
+            try:
+                return await refresh()
+            finally:
+                await asyncio.to_thread(self.cache.release_lock, lock, self.owner)
+
+        logger.info(f"⏳ Снимок '{key}' обновляет другой процесс, ждем")
+        while time.time() - started < REFRESH_LOCK_TTL:
+            await asyncio.sleep(REFRESH_POLL_INTERVAL)
+            snapshot = await asyncio.to_thread(self._read_snapshot, key)
+            if snapshot and snapshot['updated_at'] >= started:
+                return snapshot
+            if await asyncio.to_thread(self.cache.acquire_lock, lock, self.owner, REFRESH_LOCK_TTL):
+                # Другой процесс завершился без нового снимка - обновляем сами
+                try:
+                    return await refresh()
+                finally:
+                    await asyncio.to_thread(self.cache.release_lock, lock, self.owner)
+        return None
+
+    def _read_snapshot(self, key: str) -> Optional[Dict]:
+        """Снимок матчей или каналов по ключу single-flight"""
+        if key == 'matches':
+            return _with_staleness(self.cache.get_snapshot(key), MATCHES_TTL)
+        return _channels_view(self.cache.get_channels_snapshot(int(key.split(':', 1)[1])))
+
+    async def _refresh_quietly(self, key: str, refresh) -> Optional[Dict]:
+        """Фоновое обновление: ошибки только в лог"""
+        try:
+            return await self._single_flight(key, refresh)
+        except Exception as e:
+            logger.error(f"❌ Ошибка фонового обновления '{key}': {e}")
+            return None
+
+    def schedule_matches_refresh(self):
+        """Запустить обновление матчей в фоне (в текущем event loop)"""
+        asyncio.ensure_future(self._refresh_quietly('matches', self.refresh_matches))
+
+    def schedule_channels_refresh(self, match: MatchRecord):
+        """Запустить обновление каналов матча в фоне (в текущем event loop)"""
+        asyncio.ensure_future(self._refresh_quietly(
+            f'channels:{match.id}', lambda: self.refresh_channels(match)
+        ))
+
+    async def crawl(self):
+        """
+        Один обход: матчи, каналы активных матчей и предзагрузка каналов
+        матчей, которые скоро начнутся, чтобы первый запрос к началу
+        матча отдавался из снимка
+        """
+        await self._refresh_quietly('matches', self.refresh_matches)
+
+        index = await self.get_index()
+        recent = await asyncio.to_thread(self.cache.get_active_matches, ACTIVE_WINDOW)
+        active = [index.get(int(match_id)) for match_id in recent]
+        active = [match for match in active if match is not None]
+        active_ids = {match.id for match in active}
+        prefetch = [match for match in _prefetch_targets(index) if match.id not in active_ids]
+        if prefetch:
+            logger.info(f"⏩ Предзагрузка каналов {len(prefetch)} матчей перед началом")
+        active += prefetch
+        if not active:
+            return
+        logger.info(f"🕷️ Обновляем каналы {len(active)} матчей")
+        semaphore = asyncio.Semaphore(CRAWL_CONCURRENCY)
+
+        async def refresh(match):
+            async with semaphore:
+                await self._refresh_quietly(f'channels:{match.id}', lambda: self.refresh_channels(match))
+
+        await asyncio.gather(*(refresh(match) for match in active))
+
+    async def run(self):
+        """
+        Цикл обхода
+
+        Обходит только процесс, владеющий блокировкой crawler в Redis,
+        поэтому воркеры gunicorn и бот не дублируют работу друг друга
+        """
+        self.running = True
+        logger.info(f"🕷️ Фоновый обход запущен (интервал: {self.interval}s)")
+        try:
+            while self.running:
+                try:
+                    if await asyncio.to_thread(self.cache.acquire_lock, 'crawler', self.owner, self.interval * 2):
+                        await self.crawl()
+                except Exception as e:
+                    logger.error(f"❌ Ошибка в цикле обхода: {e}")
+                await asyncio.sleep(self.interval)
+        except asyncio.CancelledError:
+            logger.info("⏹️ Фоновый обход остановлен")
+            self.running = False
+
+    def stop(self):
+        """Остановить обход"""
+        self.running = False
+
+    # ============ ЧТЕНИЕ СНИМКОВ ============
+
+    def matches_snapshot(self) -> Optional[Dict]:
+        """Снимок матчей с пометкой stale (или None, если его еще нет)"""
+        return _with_staleness(self.cache.get_snapshot('matches'), MATCHES_TTL)
+
+    def channels_snapshot(self, match_id: int) -> Optional[Dict]:
+        """Снимок каналов матча с пометкой stale (или None)"""
+        self.cache.touch_active_match(str(match_id))
+        return _channels_view(self.cache.get_channels_snapshot(match_id))
+
+    async def get_matches(self) -> Dict:
+        """
+        Матчи для выдачи: снимок сразу, устаревший обновляется в фоне
+
+        Returns:
+            Снимок {'data', 'updated_at', 'stale'}
+        """
+        snapshot = await asyncio.to_thread(self.matches_snapshot)
+        if snapshot is None:
+            snapshot = await self._single_flight('matches', self.refresh_matches)
+            return snapshot or {'data': [], 'updated_at': None, 'stale': True}
+        if snapshot['stale']:
+            self.schedule_matches_refresh()
+        return snapshot
+
+    async def get_index(self) -> MatchIndex:
+        """
+        Индекс матчей по ID для текущего снимка
+
+        Индекс строится один раз на каждую версию снимка
+        """
+        snapshot = await self.get_matches()
+        index = self._index
+        if index is None or index.updated_at != snapshot['updated_at'] or index.updated_at is None:
+            index = MatchIndex(snapshot['data'], snapshot['updated_at'], snapshot['stale'], snapshot.get('version'))
+            self._index = index
+        index.stale = snapshot['stale']
+        return index
+
+    def events_since(self, since: int, limit: int = 100) -> Dict:
+        """
+        События изменений после версии since
+
+        Returns:
+            {'events', 'version', 'reset'}; reset означает, что часть событий
+            уже вытеснена и клиенту нужно перечитать снимки целиком
+        """
+        version = self.cache.get_event_version()
+        events = self.cache.get_events(since, limit)
+        missed = since < version and (not events or events[0]['version'] != since + 1)
+        return {'events': events, 'version': version, 'reset': since > version or missed}
+
+    async def get_channels(self, match: MatchRecord, budget: Optional[float] = CHANNELS_BUDGET) -> Dict:
+        """
+        Каналы матча для выдачи: снимок сразу, устаревший обновляется в фоне
+
+        Args:
+            match: Матч
+            budget: Сколько ждать загрузку, если снимка еще нет
+                (None - ждать до конца)
+
+        Returns:
+            Снимок {'data', 'updated_at', 'stale', 'complete'}
+        """
+        snapshot = await asyncio.to_thread(self.channels_snapshot, match.id)
+        if snapshot is None:
+            return await self._channels_within(match, budget)
+        if snapshot['stale']:
+            self.schedule_channels_refresh(match)
+        return snapshot
+
+    async def get_channels_batch(self, matches: List[MatchRecord],
+                                 budget: Optional[float] = CHANNELS_BUDGET) -> Dict[int, Dict]:
+        """
+        Каналы нескольких матчей за один вызов
+
+        Снимки отдаются сразу, недостающие матчи загружаются не больше
+        CRAWL_CONCURRENCY одновременно в пределах общего budget (частичные
+        результаты - с complete=False). Загрузки, не начатые до конца
+        budget, не запускаются: матчи отмечены активными, и их каналы
+        загрузит фоновый обход
+
+        Returns:
+            Словарь ID матча -> снимок (или исключение, если загрузка упала)
+        """
+        loop = asyncio.get_running_loop()
+        deadline = None if budget is None else loop.time() + budget
+        semaphore = asyncio.Semaphore(CRAWL_CONCURRENCY)
+
+        async def load(match):
+            snapshot = await asyncio.to_thread(self.channels_snapshot, match.id)
+            if snapshot is not None:
+                if snapshot['stale']:
+                    self.schedule_channels_refresh(match)
+                return snapshot
+            async with semaphore:
+                remaining = None if deadline is None else deadline - loop.time()
+                if remaining is not None and remaining <= 0:
+                    return {'data': {}, 'updated_at': time.time(), 'stale': False, 'complete': False}
+                return await self._channels_within(match, remaining)
+
+        results = await asyncio.gather(*(load(match) for match in matches), return_exceptions=True)
+        return {match.id: result for match, result in zip(matches, results)}
+
+    async def _channels_within(self, match: MatchRecord, budget: Optional[float]) -> Dict:
+        """
+        Загрузить каналы, ожидая не дольше budget
+
+        Если загрузка не успела, возвращаются уже подтвержденные каналы
+        с complete=False, а загрузка продолжается в фоне и сохраняет снимок
+        """
+        key = f'channels:{match.id}'
+        refresh = asyncio.ensure_future(self._single_flight(key, lambda: self.refresh_channels(match, budget)))
+        done, _ = await asyncio.wait({refresh}, timeout=budget)
+        if done:
+            snapshot = refresh.result()
+            return snapshot or {'data': {}, 'updated_at': None, 'stale': True, 'complete': True}
+
+        refresh.add_done_callback(_log_task_error)
+        partial = self._partial.get(key, {})
+        logger.info(f"⏱️ Каналы матча {match.id} не успели за {budget}s, отдаем {len(partial)} подтвержденных")
+        return {'data': partial, 'updated_at': time.time(), 'stale': False, 'complete': False}
+
+
+# Глобальный экземпляр
+_crawler = None
+
+def get_crawler() -> Crawler:
+    """Получить глобальный экземпляр обходчика"""
+    global _crawler
+    if _crawler is None:
+        _crawler = Crawler()
+    return _crawler
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    async def main():
+        crawler = get_crawler()
+        await crawler.crawl()
+        snapshot = crawler.matches_snapshot()
+        print(f"Матчей в снимке: {len(snapshot['data']) if snapshot else 0}")
+
+    asyncio.run(main())
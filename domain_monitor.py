@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Мониторинг зеркал gooool365
+Фоново проверяет все домены параллельно и ведет оценку задержки и ошибок,
+чтобы каждый запрос шел на лучшее зеркало в данный момент
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from urllib.parse import urlparse, urlunparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Интервал фоновой проверки зеркал (сек)
+DOMAIN_CHECK_INTERVAL = int(os.getenv('DOMAIN_CHECK_INTERVAL', '60'))
+
+
+class DomainMonitor:
+    """Оценка зеркал по задержке и доле ошибок"""
+
+    # Сглаживание EWMA для задержки и доли ошибок
+    ALPHA = 0.3
+    # Штраф к оценке (сек) при 100% ошибок
+    ERROR_PENALTY = 10.0
+    # Сколько последних задержек GET запросов хранить для перцентилей
+    LATENCY_SAMPLES = 200
+
+    def __init__(self, domains: List[str], interval: int = DOMAIN_CHECK_INTERVAL,
+                 timeout: float = 5, headers: Optional[Dict] = None):
+        """
+        Инициализация монитора
+
+        Args:
+            domains: Список зеркал в порядке предпочтения
+            interval: Интервал фоновой проверки в секундах
+            timeout: Таймаут проверки одного зеркала
+            headers: Заголовки для проверочных запросов
+        """
+        self.domains = list(domains)
+        self.interval = interval
+        self.timeout = timeout
+        self.headers = headers or {}
+        self.stats = {
+            domain: {'latency': None, 'error_rate': 0.0, 'checked_at': 0}
+            for domain in self.domains
+        }
+        self.samples = {domain: deque(maxlen=self.LATENCY_SAMPLES) for domain in self.domains}
+        self._netlocs = {urlparse(domain).netloc: domain for domain in self.domains}
+        self._lock = threading.Lock()
+        self._thread = None
+        # Одна сессия на все проверки: соединения с зеркалами переиспользуются
+        self._session = requests.Session()
+        self._session.mount('https://', HTTPAdapter(pool_maxsize=len(self.domains)))
+
+    def start(self):
+        """Запустить фоновую проверку (повторный вызов ничего не делает)"""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='domain-monitor', daemon=True)
+            self._thread.start()
+        logger.info(f"🌐 Мониторинг зеркал запущен (интервал: {self.interval}s)")
+
+    def _run(self):
+        while True:
+            try:
+                self.probe_all()
+            except Exception as e:
+                logger.error(f"❌ Ошибка при проверке зеркал: {e}")
+            time.sleep(self.interval)
+
+    def probe_all(self):
+        """Проверить все зеркала одновременно"""
+        with ThreadPoolExecutor(max_workers=len(self.domains)) as pool:
+            list(pool.map(self._probe, self.domains))
+        best = self.best()
+        logger.info(f"🌐 Лучшее зеркало: {best} ({self.score(best):.2f})")
+
+    def _probe(self, domain: str):
+        started = time.monotonic()
+        try:
+            response = self._session.head(domain, headers=self.headers, timeout=self.timeout,
+                                          allow_redirects=True, verify=False)
+            ok = response.status_code == 200
+        except Exception:
+            ok = False
+        latency = time.monotonic() - started
+        # HEAD главной быстрее GET страниц: в перцентили для хеджирования не идет
+        self.record(domain, latency if ok else self.timeout, ok, sample=False)
+
+    def domain_for(self, url: str) -> Optional[str]:
+        """Зеркало, которому принадлежит URL, или None для чужих хостов"""
+        return self._netlocs.get(urlparse(url).netloc)
+
+    def record(self, domain: str, latency: Optional[float], ok: bool, sample: bool = True):
+        """
+        Учесть результат запроса к зеркалу
+
+        Args:
+            domain: Зеркало (как в списке domains)
+            latency: Время ответа в секундах (None - не учитывать)
+            ok: Успешен ли запрос
+            sample: Добавить задержку в замеры для перцентилей (только
+                запросы страниц парсером, не фоновые проверки)
+        """
+        if domain not in self.stats:
+            return
+        with self._lock:
+            stats = self.stats[domain]
+            if latency is not None:
+                if ok and sample:
+                    self.samples[domain].append(latency)
+                if stats['latency'] is None:
+                    stats['latency'] = latency
+                else:
+                    stats['latency'] += self.ALPHA * (latency - stats['latency'])
+            stats['error_rate'] += self.ALPHA * ((0.0 if ok else 1.0) - stats['error_rate'])
+            stats['checked_at'] = time.time()
+
+    def latency_percentile(self, domain: str, percentile: float) -> Optional[float]:
+        """
+        Перцентиль задержки успешных запросов страниц к зеркалу
+
+        Returns:
+            Задержка в секундах или None, если замеров нет
+        """
+        with self._lock:
+            samples = sorted(self.samples.get(domain, ()))
+        if not samples:
+            return None
+        index = min(int(len(samples) * percentile / 100), len(samples) - 1)
+        return samples[index]
+
+    def on_mirror(self, url: str, domain: str) -> str:
+        """Тот же URL на другом зеркале"""
+        if not self.domain_for(url):
+            return url
+        target = urlparse(domain)
+        return urlunparse(urlparse(url)._replace(scheme=target.scheme, netloc=target.netloc))
+
+    def score(self, domain: str) -> float:
+        """Оценка зеркала (меньше - лучше)"""
+        stats = self.stats[domain]
+        latency = stats['latency'] if stats['latency'] is not None else self.timeout
+        return latency + stats['error_rate'] * self.ERROR_PENALTY
+
+    def ranked(self) -> List[str]:
+        """Зеркала от лучшего к худшему (при равенстве - по порядку в списке)"""
+        with self._lock:
+            return sorted(self.domains, key=lambda domain: (self.score(domain), self.domains.index(domain)))
+
+    def best(self) -> str:
+        """Лучшее зеркало в данный момент"""
+        return self.ranked()[0]
+
+    def get_stats(self) -> Dict:
+        """Текущие оценки зеркал"""
+        with self._lock:
+            return {
+                domain: {
+                    'latency': round(stats['latency'], 3) if stats['latency'] is not None else None,
+                    'error_rate': round(stats['error_rate'], 3),
+                    'score': round(self.score(domain), 3),
+                    'checked_at': stats['checked_at']
+                }
+                for domain, stats in self.stats.items()
+            }
+
+
+# Глобальный экземпляр монитора
+_monitor = None
+_monitor_lock = threading.Lock()
+
+def get_domain_monitor() -> DomainMonitor:
+    """Получить глобальный монитор зеркал (без запуска фоновой проверки)"""
+    global _monitor
+    with _monitor_lock:
+        if _monitor is None:
+            from parser import GoooolExtractor
+            _monitor = DomainMonitor(GoooolExtractor.BASE_URLS, headers=GoooolExtractor.HEADERS)
+        return _monitor
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    monitor = get_domain_monitor()
+    monitor.probe_all()
+    for domain, stats in monitor.get_stats().items():
+        print(f"{domain}: {stats}")
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Рассылка событий изменений подписчикам (Server-Sent Events)
+Один читатель на процесс получает события из stream Redis (или из
+локального журнала без Redis) и раздает их всем открытым подключениям,
+поэтому тысячи клиентов стоят одного обновления снимка и дешевой рассылки
+"""
+
+import asyncio
+import json
+import logging
+import os
+from typing import AsyncIterator, Dict, Optional, Set
+
+import redis.asyncio
+from prometheus_client import Gauge
+
+from crawler import get_crawler
+from redis_cache import get_cache, RedisCache
+
+logger = logging.getLogger(__name__)
+
+# Интервал пустого комментария, который держит соединение открытым (сек)
+HEARTBEAT_INTERVAL = float(os.getenv('SSE_HEARTBEAT_INTERVAL', '15'))
+# Сколько событий ждут отправки медленному клиенту, дальше - reset
+SUBSCRIBER_QUEUE = int(os.getenv('SSE_SUBSCRIBER_QUEUE', '100'))
+# Интервал чтения локального журнала событий без Redis (сек)
+LOCAL_POLL_INTERVAL = 1.0
+# Сколько пропущенных событий досылать при переподключении
+REPLAY_LIMIT = 500
+
+SUBSCRIBERS = Gauge('futlive_sse_subscribers', 'Открытые подписки на события', multiprocess_mode='livesum')
+
+
+def _frame(event: Dict) -> bytes:
+    """Событие в формате Server-Sent Events"""
+    data = json.dumps(event, ensure_ascii=False, separators=(',', ':'))
+    return f"id: {event['version']}\nevent: {event['type']}\ndata: {data}\n\n".encode('utf-8')
+
+
+class Subscription:
+    """Очередь событий одного подключения"""
+
+    def __init__(self, match_ids: Optional[Set[int]] = None):
+        """
+        Args:
+            match_ids: Чьи изменения каналов присылать (None - всех матчей)
+        """
+        self.match_ids = match_ids
+        self.queue: asyncio.Queue = asyncio.Queue(SUBSCRIBER_QUEUE)
+
+    def wants(self, event: Dict) -> bool:
+        """Нужно ли событие подписчику"""
+        if event['type'] != 'channels' or self.match_ids is None:
+            return True
+        return event['data'].get('match_id') in self.match_ids
+
+
+class EventHub:
+    """Один читатель событий на процесс и рассылка подписчикам"""
+
+    def __init__(self, cache: RedisCache):
+        self.cache = cache
+        self.version = 0
+        self._subscribers: Set[Subscription] = set()
+        self._reader: Optional[asyncio.Task] = None
+
+    def subscribe(self, match_ids: Optional[Set[int]] = None) -> Subscription:
+        """Подписаться на события (читатель запускается с первой подпиской)"""
+        if self._reader is None or self._reader.done():
+            self._reader = asyncio.ensure_future(self._read())
+        subscription = Subscription(match_ids)
+        self._subscribers.add(subscription)
+        SUBSCRIBERS.inc()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        """Отписаться от событий"""
+        if subscription in self._subscribers:
+            self._subscribers.discard(subscription)
+            SUBSCRIBERS.dec()
+
+    def _broadcast(self, event: Dict):
+        """Разослать событие подписчикам"""
+        for subscription in list(self._subscribers):
+            if not subscription.wants(event):
+                continue
+            try:
+                subscription.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Клиент не успевает: пропущенное заменяет одно событие reset,
+                # после которого клиент перечитывает снимки
+                while not subscription.queue.empty():
+                    subscription.queue.get_nowait()
+                subscription.queue.put_nowait({'version': event['version'], 'type': 'reset', 'data': {}})
+
+    async def _read(self):
+        """Читать новые события из stream Redis (или локального журнала)"""
+        self.version = await asyncio.to_thread(self.cache.get_event_version)
+        client = None
+        if self.cache.is_connected():
+            kwargs = self.cache.redis_client.connection_pool.connection_kwargs
+            client = redis.asyncio.Redis(
+                host=kwargs.get('host', 'localhost'),
+                port=kwargs.get('port', 6379),
+                db=kwargs.get('db', 0),
+                password=kwargs.get('password'),
+                decode_responses=True
+            )
+        logger.info(f"📡 Рассылка событий запущена (с версии {self.version})")
+        try:
+            while True:
+                try:
+                    if client is not None:
+                        # ID записи в stream - <версия>-0, читаем все после текущей
+                        entries = await client.xread(
+                            {RedisCache.EVENTS_STREAM: f'{self.version}-0'},
+                            count=100, block=int(HEARTBEAT_INTERVAL * 1000)
+                        )
+                        events = [json.loads(fields['event']) for _, items in entries for _, fields in items]
+                    else:
+                        await asyncio.sleep(LOCAL_POLL_INTERVAL)
+                        events = await asyncio.to_thread(self.cache.get_events, self.version, 100)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"❌ Ошибка чтения событий: {e}")
+                    await asyncio.sleep(LOCAL_POLL_INTERVAL)
+                    continue
+                for event in events:
+                    self.version = max(self.version, event['version'])
+                    self._broadcast(event)
+        finally:
+            if client is not None:
+                await client.aclose()
+
+    async def stream(self, since: Optional[int] = None,
+                     match_ids: Optional[Set[int]] = None) -> AsyncIterator[bytes]:
+        """
+        Поток событий для одного подключения в формате Server-Sent Events
+
+        Args:
+            since: Последняя версия, которую видел клиент (Last-Event-ID);
+                пропущенные события досылаются, а если их уже нет в stream -
+                приходит событие reset
+            match_ids: Чьи изменения каналов присылать (None - всех матчей)
+        """
+        subscription = self.subscribe(match_ids)
+        try:
+            yield b'retry: 3000\n\n'
+            last = 0
+            if since is not None:
+                # Подписка уже идет, поэтому новые события не теряются,
+                # а повторы после досылки пропускаются по версии
+                replay = await asyncio.to_thread(get_crawler().events_since, since, REPLAY_LIMIT)
+                if replay['reset'] or len(replay['events']) >= REPLAY_LIMIT:
+                    last = replay['version']
+                    yield _frame({'version': last, 'type': 'reset', 'data': {}})
+                else:
+                    for event in replay['events']:
+                        last = event['version']
+                        if subscription.wants(event):
+                            yield _frame(event)
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield b': ping\n\n'
+                    continue
+                if event['version'] > last or event['type'] == 'reset':
+                    last = event['version']
+                    yield _frame(event)
+        finally:
+            self.unsubscribe(subscription)
+
+
+# Глобальная рассылка
+_hub = None
+
+def get_event_hub() -> EventHub:
+    """Получить рассылку событий процесса"""
+    global _hub
+    if _hub is None:
+        _hub = EventHub(get_cache())
+    return _hub
@@ -0,0 +1,11 @@
+"""
+Настройки gunicorn (файл подхватывается из рабочего каталога автоматически,
+параметры запуска - в start_backend.sh)
+"""
+
+from prometheus_config import mark_process_dead
+
+
+def child_exit(server, worker):
+    """Живые gauge завершившегося воркера больше не входят в сумму"""
+    mark_process_dead(worker.pid)
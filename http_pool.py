@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Пул исходящих соединений парсера
+Общий для всех запросов процесса: размер пула на хост, кэш DNS с TTL,
+keep-alive и метрики пула (попадания в кэш DNS, новые и повторно
+используемые соединения, ожидание свободного соединения). Рукопожатие TLS
+экономится только повторным использованием соединений: сессии TLS между
+соединениями не возобновляются
+"""
+
+import os
+import ssl
+import threading
+from typing import Dict
+
+import aiohttp
+from prometheus_client import Counter, Histogram
+
+# Асинхронный пул: всего соединений и на один хост
+POOL_LIMIT = int(os.getenv('PARSER_POOL_LIMIT', '100'))
+POOL_LIMIT_PER_HOST = int(os.getenv('PARSER_POOL_LIMIT_PER_HOST', '20'))
+# Сколько секунд хранить адреса в кэше DNS и держать простаивающее соединение
+DNS_CACHE_TTL = int(os.getenv('PARSER_DNS_CACHE_TTL', '300'))
+KEEPALIVE_TIMEOUT = float(os.getenv('PARSER_KEEPALIVE_TIMEOUT', '30'))
+
+# Синхронный пул requests: сколько хостов держать и соединений на хост
+SYNC_POOL_HOSTS = int(os.getenv('PARSER_SYNC_POOL_HOSTS', '64'))
+SYNC_POOL_PER_HOST = int(os.getenv('PARSER_SYNC_POOL_PER_HOST', '16'))
+
+# События пула: dns_hit, dns_miss, new, reused, queued (доли попаданий
+# считаются в Prometheus, например reused / (new + reused))
+POOL_EVENTS = Counter('futlive_http_pool_events_total', 'События пула исходящих соединений', ['event'])
+CONNECT_SECONDS = Histogram(
+    'futlive_http_connect_seconds', 'Установка нового соединения (DNS, TCP, TLS)',
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+)
+QUEUE_SECONDS = Histogram(
+    'futlive_http_pool_wait_seconds', 'Ожидание свободного соединения в пуле',
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+
+_ssl_context = None
+_ssl_lock = threading.Lock()
+
+
+def get_ssl_context() -> ssl.SSLContext:
+    """
+    SSL контекст для всех TLS соединений (создается один раз на процесс,
+    возобновления сессий TLS он не дает)
+
+    Проверка сертификатов отключена, как и раньше: у части сайтов
+    трансляций они некорректны
+    """
+    global _ssl_context
+    with _ssl_lock:
+        if _ssl_context is None:
+            context = ssl.create_default_context()
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+            _ssl_context = context
+        return _ssl_context
+
+
+def _trace_config() -> aiohttp.TraceConfig:
+    """Сбор метрик пула из событий aiohttp"""
+    trace_config = aiohttp.TraceConfig()
+
+    async def on_dns_cache_hit(session, ctx, params):
+        POOL_EVENTS.labels('dns_hit').inc()
+
+    async def on_dns_cache_miss(session, ctx, params):
+        POOL_EVENTS.labels('dns_miss').inc()
+
+    async def on_connection_create_start(session, ctx, params):
+        ctx.connect_started = session.loop.time()
+
+    async def on_connection_create_end(session, ctx, params):
+        POOL_EVENTS.labels('new').inc()
+        CONNECT_SECONDS.observe(session.loop.time() - ctx.connect_started)
+
+    async def on_connection_reuseconn(session, ctx, params):
+        POOL_EVENTS.labels('reused').inc()
+
+    async def on_connection_queued_start(session, ctx, params):
+        POOL_EVENTS.labels('queued').inc()
+        ctx.queued_started = session.loop.time()
+
+    async def on_connection_queued_end(session, ctx, params):
+        QUEUE_SECONDS.observe(session.loop.time() - ctx.queued_started)
+
+    trace_config.on_dns_cache_hit.append(on_dns_cache_hit)
+    trace_config.on_dns_cache_miss.append(on_dns_cache_miss)
+    trace_config.on_connection_create_start.append(on_connection_create_start)
+    trace_config.on_connection_create_end.append(on_connection_create_end)
+    trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+    trace_config.on_connection_queued_start.append(on_connection_queued_start)
+    trace_config.on_connection_queued_end.append(on_connection_queued_end)
+    return trace_config
+
+
+def create_session(headers: Dict) -> aiohttp.ClientSession:
+    """
+    Сессия aiohttp с общим пулом соединений
+
+    Создавать внутри работающего event loop
+    """
+    connector = aiohttp.TCPConnector(
+        limit=POOL_LIMIT,
+        limit_per_host=POOL_LIMIT_PER_HOST,
+        use_dns_cache=True,
+        ttl_dns_cache=DNS_CACHE_TTL,
+        keepalive_timeout=KEEPALIVE_TIMEOUT,
+        ssl=get_ssl_context()
+    )
+    return aiohttp.ClientSession(headers=headers, connector=connector, trace_configs=[_trace_config()])
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Индекс матчей по стабильному ID
+ID матча - числовой newsid gooool365 из URL вида /online/<newsid>-...,
+поэтому он не меняется при перестановке списка между обновлениями
+"""
+
+import os
+import re
+import time
+from urllib.parse import urlsplit
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+_NEWSID_RE = re.compile(r'/online/(\d+)-')
+# Время начала в тексте матча ("18:00 Команда 1 - Команда 2")
+_KICKOFF_RE = re.compile(r'(?<![\d:.])([01]?\d|2[0-3])[:.]([0-5]\d)(?![\d:.])')
+# Пометки идущего матча
+_LIVE_RE = re.compile(r'\blive\b|\bидет\b|\d\s*-?\s*й\s+тайм|перерыв', re.IGNORECASE)
+
+# Часовой пояс времени на сайте (часы от UTC)
+SOURCE_UTC_OFFSET = float(os.getenv('SOURCE_UTC_OFFSET', '3'))
+
+
+class MatchRecord(NamedTuple):
+    """Компактная запись о матче"""
+    id: int
+    title: str
+    url: str
+
+    def to_dict(self) -> Dict:
+        return self._asdict()
+
+
+def match_id_from_url(url: str) -> Optional[int]:
+    """newsid матча из URL или None"""
+    match = _NEWSID_RE.search(url or '')
+    return int(match.group(1)) if match else None
+
+
+def kickoff_time(title: str, now: Optional[float] = None) -> Optional[float]:
+    """
+    Время начала матча (unix time) по времени в названии или None
+
+    На сайте указано только время без даты, поэтому берется ближайший
+    к now момент с этим временем (не дальше 12 часов)
+    """
+    found = _KICKOFF_RE.search(title or '')
+    if found is None:
+        return None
+    now = time.time() if now is None else now
+    local_now = datetime.fromtimestamp(now, timezone(timedelta(hours=SOURCE_UTC_OFFSET)))
+    kickoff = local_now.replace(hour=int(found.group(1)), minute=int(found.group(2)),
+                                second=0, microsecond=0).timestamp()
+    if kickoff < now - 12 * 3600:
+        kickoff += 24 * 3600
+    elif kickoff > now + 12 * 3600:
+        kickoff -= 24 * 3600
+    return kickoff
+
+
+def is_live(title: str) -> bool:
+    """Есть ли в названии пометка идущего матча"""
+    return _LIVE_RE.search(title or '') is not None
+
+
+class MatchIndex:
+    """Индекс ID -> запись матча с сохранением порядка списка"""
+
+    __slots__ = ('records', 'order', 'updated_at', 'stale', 'version')
+
+    def __init__(self, matches: List[Dict], updated_at: Optional[float] = None, stale: bool = False,
+                 version: Optional[int] = None):
+        """
+        Args:
+            matches: Список матчей из снимка
+            updated_at: Время снимка
+            stale: Устарел ли снимок
+            version: Версия последнего события изменения списка
+        """
+        self.records: Dict[int, MatchRecord] = {}
+        self.order: List[int] = []
+        self.updated_at = updated_at
+        self.stale = stale
+        self.version = version
+        for match in matches:
+            match_id = match.get('id')
+            if match_id is None:
+                match_id = match_id_from_url(match.get('url', ''))
+            if match_id is None or match_id in self.records:
+                continue
+            self.records[match_id] = MatchRecord(match_id, match.get('title', 'Unknown'), match.get('url', ''))
+            self.order.append(match_id)
+
+    def get(self, match_id: int) -> Optional[MatchRecord]:
+        """Запись матча по ID или None"""
+        return self.records.get(match_id)
+
+    def __contains__(self, match_id) -> bool:
+        return match_id in self.records
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def __iter__(self) -> Iterator[MatchRecord]:
+        return (self.records[match_id] for match_id in self.order)
+
+    def to_list(self) -> List[Dict]:
+        """Матчи в порядке списка для API"""
+        return [record.to_dict() for record in self]
+
+
+# ============ РАЗНИЦА МЕЖДУ СНИМКАМИ ============
+
+def _stable_fields(record: MatchRecord):
+    """
+    Поля матча для сравнения между снимками
+
+    Хост URL зависит от текущего лучшего зеркала, поэтому сравнивается
+    только путь: смена зеркала не должна считаться изменением матча
+    """
+    return record.title, urlsplit(record.url).path
+
+
+def diff_matches(old: List[Dict], new: List[Dict]) -> Optional[Dict]:
+    """
+    Разница между двумя списками матчей
+
+    Returns:
+        {'added': [матч], 'removed': [id], 'changed': [матч]} или None без изменений
+    """
+    before, after = MatchIndex(old), MatchIndex(new)
+    added = [after.records[match_id].to_dict() for match_id in after.order if match_id not in before]
+    removed = [match_id for match_id in before.order if match_id not in after]
+    changed = [
+        after.records[match_id].to_dict() for match_id in after.order
+        if match_id in before and _stable_fields(before.records[match_id]) != _stable_fields(after.records[match_id])
+    ]
+    if not (added or removed or changed):
+        return None
+    return {'added': added, 'removed': removed, 'changed': changed}
+
+
+def diff_channels(old: Dict[str, str], new: Dict[str, str]) -> Optional[Dict]:
+    """
+    Разница между наборами каналов матча (название -> url)
+
+    Returns:
+        {'added': {название: url}, 'removed': [название]} или None без изменений.
+        Канал с новым url попадает в added
+    """
+    added = {title: url for title, url in new.items() if old.get(title) != url}
+    removed = [title for title in old if title not in new]
+    if not (added or removed):
+        return None
+    return {'added': added, 'removed': removed}
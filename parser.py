@@ -1,15 +1,147 @@
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import lxml.html
+from lxml import etree
 import re
 import json
+import hashlib
 import time
 import logging
+import threading
+import os
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, wait
 from urllib.parse import urljoin, urlparse
 
+from redis_cache import get_cache
+from domain_monitor import get_domain_monitor
+from rate_limiter import CircuitOpenError, RateLimitedError, get_outbound_guard
+from scrape_trace import ScrapeTrace, TRUNCATED_BODIES
+from http_pool import SYNC_POOL_HOSTS, SYNC_POOL_PER_HOST
+
 # Настройка логирования для парсера
 logger = logging.getLogger(__name__)
 
-class GoooolParser:
+# Служебные iframe, которые не являются трансляциями
+IFRAME_BLOCKLIST = ['google', 'yandex', 'cackle', 'vk.com', 'facebook', 'twitter', 'instagram', 'metrika', 'analytics']
+# Служебные URL среди ссылок на сторонние плееры
+EXTERNAL_BLOCKLIST = ['gooool365.org', 'yandex', 'google', 'schema.org', 'javascript']
+# Паттерны для поиска URL плееров
+PLAYER_PATTERNS = [
+    r'https?://[^\s\'"]+\.php[^\s\'"]*',
+    r'https?://[^\s\'"]+/player[^\s\'"]*',
+    r'https?://[^\s\'"]+/embed/[^\s\'"]*',
+    r'https?://[^\s\'"]+/live/[^\s\'"]*',
+    r'https?://[^\s\'"]+/stream[^\s\'"]*',
+]
+
+# Предкомпилированные паттерны для разбора страниц
+_IFRAME_RE = re.compile(r'<iframe[^>]+src=["\']([^"\']+)["\'][^>]*>', re.IGNORECASE)
+_VIDEOID_RE = re.compile(r'videoid\d+\s*=\s*[\'"](.*?)[\'"]', re.DOTALL)
+_VIDEO_SRC_RE = re.compile(r'src=["\'](.*?)["\']')
+_URL_RE = re.compile(r'https?://[^\s\'"]+', re.IGNORECASE)
+_PLAYER_RES = [re.compile(pattern, re.IGNORECASE) for pattern in PLAYER_PATTERNS]
+_ACE_ID_RE = re.compile(r'acestream://([a-f0-9]{40})')
+_ONLINE_RE = re.compile(r'/online/\d+')
+_MATCH_URL_RE = re.compile(r'/online/(\d+)-')
+_IFRAME_BLOCK_RE = re.compile('|'.join(map(re.escape, IFRAME_BLOCKLIST)), re.IGNORECASE)
+_EXTERNAL_BLOCK_RE = re.compile('|'.join(map(re.escape, EXTERNAL_BLOCKLIST)), re.IGNORECASE)
+# Позиции, с которых может начаться iframe, videoidN или URL
+_ANCHOR_RE = re.compile(r'(?P<iframe>(?i:<iframe))|(?P<video>videoid\d)|(?P<url>(?i:https?://))')
+
+_HTML_PARSER = lxml.html.HTMLParser(encoding='utf-8')
+
+# Потоковое чтение ответов: размер куска, предел размера тела и сколько байт
+# без новых ссылок на матчи считать концом списка на главной (0 - читать всё)
+STREAM_CHUNK_SIZE = 16384
+MAX_PAGE_BYTES = int(os.getenv('PARSER_MAX_PAGE_BYTES', str(2 * 1024 * 1024)))
+HOME_STOP_GAP = int(os.getenv('PARSER_HOME_STOP_GAP', '65536'))
+_MATCH_LINK_BYTES_RE = re.compile(rb'/online/\d+-')
+
+
+class MatchListEnd:
+    """
+    Конец списка матчей при потоковом чтении главной страницы
+
+    Список считается законченным на первой ссылке на матч, за которой
+    больше gap байт без новых ссылок. Тело обрезается по концу этой ссылки
+    плюс gap (end): граница не зависит от того, как сеть разбила тело на
+    куски, поэтому хэш одной и той же страницы совпадает между загрузками
+    """
+
+    def __init__(self, gap=HOME_STOP_GAP):
+        self.gap = gap
+        self.last_link = None
+        self.end = None
+
+    def __call__(self, body, start):
+        """
+        Args:
+            body: Прочитанная часть тела
+            start: Где в body начинается новый кусок
+        """
+        if self.gap <= 0:
+            return False
+        # Ссылка может начаться в конце предыдущего куска
+        for match in _MATCH_LINK_BYTES_RE.finditer(body, max(0, start - 24)):
+            if match.end() <= (self.last_link or 0):
+                continue
+            if self.last_link is not None and match.start() - self.last_link > self.gap:
+                break
+            self.last_link = match.end()
+        if self.last_link is None or len(body) - self.last_link <= self.gap:
+            return False
+        self.end = self.last_link + self.gap
+        return True
+
+
+class BodyReader:
+    """Чтение тела ответа по кускам с пределом размера и ранней остановкой"""
+
+    def __init__(self, max_bytes=MAX_PAGE_BYTES, stop=None):
+        """
+        Args:
+            max_bytes: Предел размера тела, остальное отбрасывается
+            stop: Функция(body, start) -> True, когда дальше читать не нужно
+        """
+        self.max_bytes = max_bytes
+        self.stop = stop
+        self.buffer = bytearray()
+        self.stopped = None
+
+    def feed(self, chunk):
+        """
+        Добавить кусок тела
+
+        Returns:
+            False, если дальше читать не нужно
+        """
+        start = len(self.buffer)
+        self.buffer += chunk
+        if len(self.buffer) > self.max_bytes:
+            del self.buffer[self.max_bytes:]
+            self.stopped = 'size_cap'
+        elif self.stop is not None and self.stop(self.buffer, start):
+            self.stopped = 'early_stop'
+            # Граница конца данных, если ее задает функция остановки
+            end = getattr(self.stop, 'end', None)
+            if end is not None:
+                del self.buffer[end:]
+        if self.stopped:
+            TRUNCATED_BODIES.labels(self.stopped).inc()
+            return False
+        return True
+
+    @property
+    def body(self):
+        return bytes(self.buffer)
+
+class GoooolExtractor:
+    """
+    Общая часть синхронного и асинхронного парсеров:
+    домены, заголовки и разбор HTML без сетевых запросов
+    """
     # Список альтернативных доменов
     BASE_URLS = [
         "https://gooool365.org",
@@ -32,266 +164,665 @@ class GoooolParser:
         'Cache-Control': 'max-age=0',
     }
 
+    # Параллельная проверка ссылок: общий лимит, лимит на хост и общий дедлайн (сек)
+    VALIDATION_CONCURRENCY = 16
+    VALIDATION_PER_HOST = 4
+    VALIDATION_DEADLINE = 8
+    # Таймаут одной проверки (сек), у последних проверок - остаток до дедлайна
+    PROBE_TIMEOUT = 5
+
+    # Сколько страниц хранить для условных запросов
+    PAGE_CACHE_SIZE = 256
+
+    @property
+    def base_url(self):
+        """Лучшее зеркало по оценке монитора доменов"""
+        return get_domain_monitor().best()
+
+    def _rebase_url(self, url):
+        """Переносит URL страницы сайта на текущее лучшее зеркало"""
+        monitor = get_domain_monitor()
+        return monitor.on_mirror(url, monitor.best())
+
+    def _record_mirror(self, url, started, ok):
+        """Учитывает ответ зеркала в оценке монитора доменов"""
+        monitor = get_domain_monitor()
+        domain = monitor.domain_for(url)
+        if domain:
+            monitor.record(domain, time.monotonic() - started if ok else None, ok)
+
+    def __init__(self):
+        # url -> ETag, Last-Modified, хэш содержимого и результат разбора.
+        # Синхронный парсер обращается из потоков пула, поэтому порядок LRU
+        # меняется только под блокировкой
+        self._pages = OrderedDict()
+        self._pages_lock = threading.Lock()
+
+    def _conditional_headers(self, url):
+        """Заголовки условного запроса для ранее загруженной страницы"""
+        state = self._pages.get(url)
+        headers = {}
+        if state:
+            if state['etag']:
+                headers['If-None-Match'] = state['etag']
+            if state['last_modified']:
+                headers['If-Modified-Since'] = state['last_modified']
+        return headers
+
+    def _cached_page(self, url, status, body):
+        """
+        Прошлый результат разбора, если страница не изменилась (304 или тот же хэш)
+
+        Returns:
+            (найден ли результат, результат, хэш содержимого)
+        """
+        with self._pages_lock:
+            state = self._pages.get(url)
+            if status == 304 and state:
+                self._pages.move_to_end(url)
+        if status == 304 and state:
+            print(f"[PARSER] Страница не изменилась (304): {url}")
+            return True, state['result'], state['hash']
+
+        digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+        if state and state['hash'] == digest:
+            print(f"[PARSER] Содержимое не изменилось: {url}")
+            return True, state['result'], digest
+        return False, None, digest
+
+    def _remember_page(self, url, headers, digest, result):
+        """Запоминает валидаторы и результат разбора страницы"""
+        state = {
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'hash': digest,
+            'result': result
+        }
+        with self._pages_lock:
+            self._pages[url] = state
+            self._pages.move_to_end(url)
+            while len(self._pages) > self.PAGE_CACHE_SIZE:
+                self._pages.popitem(last=False)
+
+    def _page_result(self, url, status, headers, body, parse):
+        """
+        Результат разбора страницы с учетом условного запроса
+
+        При 304 или неизменном хэше содержимого возвращается прошлый
+        результат без повторного разбора HTML
+
+        Args:
+            url: URL страницы
+            status: HTTP статус ответа
+            headers: Заголовки ответа
+            body: Тело ответа (bytes)
+            parse: Функция разбора HTML
+        """
+        found, result, digest = self._cached_page(url, status, body)
+        if status == 304 and found:
+            return result
+        if not found:
+            result = parse(body.decode('utf-8', errors='replace'))
+        self._remember_page(url, headers, digest, result)
+        return result
+
+    def _extract_body(self, kind, body):
+        """Разбор тела ответа по виду страницы (см. extract_page)"""
+        return _EXTRACTORS[kind](self, body.decode('utf-8', errors='replace'))
+
+    def _parse_match_page(self, html):
+        """
+        Кандидаты со страницы матча за один проход по HTML
+
+        Returns:
+            (iframe и скрипты, группы сторонних плееров)
+        """
+        iframes, videos, external = self._scan_match_page(html)
+
+        candidates = []
+        for i, src in enumerate(iframes):
+            # Пропускаем служебные iframe
+            if _IFRAME_BLOCK_RE.search(src):
+                continue
+            candidates.append({'type': 'web', 'title': f'Трансляция {i+1}', 'url': self._absolute_url(src), 'source': 'iframe'})
+        for i, video_html in enumerate(videos):
+            src_match = _VIDEO_SRC_RE.search(video_html)
+            if src_match:
+                candidates.append({'type': 'web', 'title': f'Канал {i+1}', 'url': self._absolute_url(src_match.group(1)), 'source': 'script'})
+
+        external_candidates = [
+            {'type': 'web', 'source': 'external', 'alternatives': urls}
+            for urls in external if urls
+        ]
+        return candidates, external_candidates
+
+    def _scan_match_page(self, html):
+        """
+        Один проход по HTML страницы матча
+
+        Сканирует только позиции, с которых может начаться iframe, videoidN
+        или URL, и для каждого вида ведет свою границу, поэтому результат
+        совпадает с отдельными findall по каждому паттерну
+
+        Returns:
+            (src iframe, содержимое videoidN, URL сторонних плееров по паттернам)
+        """
+        iframes = []
+        videos = []
+        external = [[] for _ in _PLAYER_RES]
+        iframe_end = video_end = url_end = 0
+
+        for anchor in _ANCHOR_RE.finditer(html):
+            pos = anchor.start()
+            kind = anchor.lastgroup
+            if kind == 'iframe':
+                if pos >= iframe_end:
+                    match = _IFRAME_RE.match(html, pos)
+                    if match:
+                        iframes.append(match.group(1))
+                        iframe_end = match.end()
+            elif kind == 'video':
+                if pos >= video_end:
+                    match = _VIDEOID_RE.match(html, pos)
+                    if match:
+                        videos.append(match.group(1))
+                        video_end = match.end()
+            elif pos >= url_end:
+                match = _URL_RE.match(html, pos)
+                if match:
+                    url_end = match.end()
+                    token = match.group(0)
+                    # Фильтруем служебные URL
+                    if _EXTERNAL_BLOCK_RE.search(token):
+                        continue
+                    for urls, pattern in zip(external, _PLAYER_RES):
+                        player_match = pattern.match(token)
+                        if player_match:
+                            urls.append(player_match.group(0))
+
+        return iframes, videos, external
+
+    def _absolute_url(self, url):
+        """Приводит относительную ссылку к абсолютной"""
+        if url.startswith('//'):
+            return 'https:' + url
+        if url.startswith('/'):
+            return self.base_url + url
+        return url
+
+    @staticmethod
+    def _html_tree(html):
+        """Дерево lxml для HTML или None для пустого документа"""
+        if not html or not html.strip():
+            return None
+        try:
+            return lxml.html.fromstring(html.encode('utf-8'), parser=_HTML_PARSER)
+        except etree.ParserError:
+            return None
+
+    @staticmethod
+    def _element_text(element):
+        """Текст элемента как у BeautifulSoup get_text(strip=True)"""
+        return ''.join(part.strip() for part in element.itertext())
+
+    def _parse_matches(self, html):
+        """Извлекает список матчей из HTML главной страницы"""
+        tree = self._html_tree(html)
+        if tree is None:
+            return []
+
+        matches = []
+        seen_urls = set()
+        # Ищем все ссылки на матчи
+        for link in tree.iter('a'):
+            url = link.get('href')
+            if not url or not _ONLINE_RE.search(url):
+                continue
+
+            title = self._element_text(link)
+
+            if not url.startswith('http'):
+                url = self.base_url + url
+
+            # Фильтруем только прямые трансляции
+            if title and url not in seen_urls:
+                newsid_match = _MATCH_URL_RE.search(url)
+                if newsid_match:
+                    # newsid - стабильный ID матча между обновлениями
+                    matches.append({'id': int(newsid_match.group(1)), 'title': title, 'url': url})
+                    seen_urls.add(url)
+                    print(f"[PARSER] Найден матч: {title}")
+
+        return matches
+
+    def _parse_match_title(self, html):
+        """Извлекает заголовок матча"""
+        tree = self._html_tree(html)
+        if tree is None:
+            return 'Матч'
+        title_tag = tree.find('.//h1')
+        if title_tag is None:
+            title_tag = tree.find('.//title')
+        return self._element_text(title_tag) if title_tag is not None else 'Матч'
+
+    def _extract_newsid(self, match_url):
+        """Возвращает newsid матча из URL вида /online/<newsid>-..."""
+        newsid_match = _MATCH_URL_RE.search(match_url)
+        return newsid_match.group(1) if newsid_match else None
+
+    def _player_headers(self, match_url):
+        """Заголовки для POST запроса к /player/"""
+        headers = self.HEADERS.copy()
+        headers['Referer'] = match_url
+        headers['X-Requested-With'] = 'XMLHttpRequest'
+        headers['Content-Type'] = 'application/x-www-form-urlencoded; charset=UTF-8'
+        return headers
+
+    def _parse_player_html(self, player_html):
+        """
+        Разбирает ответ /player/
+
+        Returns:
+            (ace_links, iframes): ссылки Ace Stream и (индекс, url) доп. iframe
+        """
+        ace_links = []
+
+        # Ищем Ace Stream ссылки
+        ace_ids = _ACE_ID_RE.findall(player_html)
+
+        # Ищем ссылки Ace Stream с названиями
+        tree = self._html_tree(player_html)
+        ace_tags = []
+        if tree is not None:
+            ace_tags = [tag for tag in tree.iter('a') if 'acestream://' in (tag.get('href') or '')]
+
+        for tag in ace_tags:
+            title = self._element_text(tag) or "Ace Stream"
+            href = tag.get('href')
+            ace_links.append({
+                'type': 'acestream', 
+                'title': title, 
+                'url': href,
+                'source': 'player_api'
+            })
+            print(f"[PARSER] Найден Ace Stream: {title}")
+
+        if not ace_tags and ace_ids:
+            for i, ace_id in enumerate(ace_ids):
+                ace_links.append({
+                    'type': 'acestream', 
+                    'title': f'Ace Stream {i+1}', 
+                    'url': f'acestream://{ace_id}',
+                    'source': 'player_api'
+                })
+                print(f"[PARSER] Найден Ace Stream ID: {ace_id}")
+
+        # Ищем дополнительные iframe в ответе /player/
+        iframes = [(i, self._absolute_url(src)) for i, src in enumerate(_IFRAME_RE.findall(player_html))]
+
+        return ace_links, iframes
+
+    @staticmethod
+    def _player_candidates(ace_links, player_iframes):
+        """Кандидаты из ответа /player/"""
+        candidates = list(ace_links)
+        for i, src in player_iframes:
+            candidates.append({'type': 'web', 'title': f'Доп. канал {i+1}', 'url': src, 'source': 'player_iframe'})
+        return candidates
+
+    @staticmethod
+    def _probe_urls(candidates):
+        """URL, требующие проверки доступности, без повторов"""
+        urls = []
+        for candidate in candidates:
+            if candidate['type'] == 'acestream':
+                continue
+            for url in candidate.get('alternatives') or [candidate['url']]:
+                if url not in urls:
+                    urls.append(url)
+        return urls
+
+    @staticmethod
+    def _assemble_links(candidates, accessible):
+        """
+        Собирает итоговый список ссылок по результатам проверки
+
+        Args:
+            candidates: Кандидаты в порядке вывода
+            accessible: Словарь url -> bool
+        """
+        links = []
+        for candidate in candidates:
+            if candidate['type'] == 'acestream':
+                links.append(dict(candidate))
+            elif 'alternatives' in candidate:
+                # Берем только первое доступное совпадение каждого типа
+                for url in candidate['alternatives']:
+                    if accessible.get(url):
+                        links.append({
+                            'type': 'web', 
+                            'title': f'Плеер {len(links)+1}', 
+                            'url': url,
+                            'source': 'external'
+                        })
+                        break
+            elif accessible.get(candidate['url']):
+                links.append(dict(candidate))
+        return links
+
+    @staticmethod
+    def _unique_links(links):
+        """Убирает дубликаты ссылок, сохраняя порядок"""
+        unique_links = []
+        seen_urls = set()
+        for link in links:
+            if link['url'] and link['url'] not in seen_urls:
+                seen_urls.add(link['url'])
+                unique_links.append(link)
+        return unique_links
+
+
+class _PinnedExtractor(GoooolExtractor):
+    """Разбор с заданным зеркалом (в процессе пула нет монитора зеркал)"""
+
+    def __init__(self, base_url):
+        super().__init__()
+        self._base_url = base_url
+
+    @property
+    def base_url(self):
+        return self._base_url
+
+
+# Разбор страниц по виду
+_EXTRACTORS = {
+    'matches': GoooolExtractor._parse_matches,
+    'match_page': GoooolExtractor._parse_match_page,
+    'player': GoooolExtractor._parse_player_html,
+}
+
+def extract_page(kind, body, base_url):
+    """
+    Разбор страницы без экземпляра парсера, для пула процессов
+
+    Args:
+        kind: 'matches', 'match_page' или 'player'
+        body: Тело ответа (bytes)
+        base_url: Зеркало для относительных ссылок
+
+    Returns:
+        Результат соответствующего метода разбора (только простые типы)
+    """
+    return _PinnedExtractor(base_url)._extract_body(kind, body)
+
+
+class GuardedAdapter(HTTPAdapter):
+    """HTTPAdapter, пропускающий запросы через общий лимитер и circuit breaker"""
+
+    def send(self, request, **kwargs):
+        guard = get_outbound_guard()
+        host = urlparse(request.url).netloc.lower()
+        # Ожидание очереди входит в таймаут запроса (проверки ссылок
+        # получают таймаут по остатку дедлайна)
+        timeout = kwargs.get('timeout')
+        budget = timeout if isinstance(timeout, (int, float)) else None
+        wait = guard.before_request(host, budget)
+        if wait:
+            time.sleep(wait)
+            if budget is not None:
+                kwargs['timeout'] = max(budget - wait, 0.001)
+        try:
+            response = super().send(request, **kwargs)
+        except Exception:
+            guard.after_request(host, error=True)
+            raise
+        guard.after_request(host, status=response.status_code)
+        return response
+
+
+class GoooolParser(GoooolExtractor):
+
     def __init__(self):
+        super().__init__()
         self.session = requests.Session()
         self.session.headers.update(self.HEADERS)
         # Отключаем проверку SSL для некоторых проблемных сайтов
         self.session.verify = False
-        # Добавляем адаптер с retries
-        from requests.adapters import HTTPAdapter
-        from urllib3.util.retry import Retry
-        
+        # Добавляем адаптер с общим лимитером и circuit breaker.
+        # Повторяем только сбои соединения: 429/5xx учитывает circuit breaker,
+        # мгновенные повторы из каждого потока лишь усиливают троттлинг
         retry_strategy = Retry(
-            total=3,
-            status_forcelist=[429, 500, 502, 503, 504],
+            total=2,
+            status_forcelist=[],
+            backoff_factor=0.5,
             allowed_methods=["HEAD", "GET", "OPTIONS"]
         )
-        adapter = HTTPAdapter(max_retries=retry_strategy)
+        # Пул на хост не меньше числа потоков проверки, иначе соединения
+        # сверх 10 закрываются после каждого запроса
+        adapter = GuardedAdapter(
+            pool_connections=SYNC_POOL_HOSTS,
+            pool_maxsize=max(SYNC_POOL_PER_HOST, self.VALIDATION_CONCURRENCY),
+            max_retries=retry_strategy
+        )
         self.session.mount("http://", adapter)
         self.session.mount("https://", adapter)
         
-        # Определяем рабочий домен
-        self.base_url = self._find_working_domain()
+        # Отдельная сессия проверок без повторов: повтор не укладывается
+        # в дедлайн проверки, а недоступная ссылка просто отбрасывается
+        self.probe_session = requests.Session()
+        self.probe_session.headers.update(self.HEADERS)
+        self.probe_session.verify = False
+        probe_adapter = GuardedAdapter(
+            pool_connections=SYNC_POOL_HOSTS,
+            pool_maxsize=self.VALIDATION_CONCURRENCY,
+            max_retries=0
+        )
+        self.probe_session.mount("http://", probe_adapter)
+        self.probe_session.mount("https://", probe_adapter)
         
-    def _find_working_domain(self):
-        """Находит рабочий домен из списка альтернатив"""
-        import time
+        # Пул для параллельной проверки ссылок
+        self._validation_pool = ThreadPoolExecutor(max_workers=self.VALIDATION_CONCURRENCY)
+        self._host_semaphores = {}
+        self._host_lock = threading.Lock()
         
-        for url in self.BASE_URLS:
-            try:
-                logger.info(f"Проверка домена: {url}")
-                response = self.session.head(url, timeout=5, allow_redirects=True)
-                if response.status_code == 200:
-                    logger.info(f"✅ Рабочий домен найден: {url}")
-                    return url
-                else:
-                    logger.warning(f"❌ Домен {url} вернул {response.status_code}")
-            except Exception as e:
-                logger.warning(f"❌ Ошибка при проверке {url}: {e}")
-            time.sleep(0.5)
+        # Зеркала проверяются в фоне, base_url всегда указывает на лучшее
+        get_domain_monitor().start()
         
-        # Если ни один домен не работает, используем первый
-        logger.warning("⚠️ Ни один домен не отвечает, используем первый из списка")
-        return self.BASE_URLS[0]
+    def _fetch_page(self, url, parse, trace, stop=None):
+        """
+        Условный GET страницы сайта с разбором (см. _page_result)
+
+        Тело читается по кускам не больше MAX_PAGE_BYTES
 
-    def get_matches(self):
+        Args:
+            stop: Функция ранней остановки чтения (см. BodyReader)
+        """
+        started = time.monotonic()
+        reader = BodyReader(stop=stop)
         try:
-            print(f"[PARSER] Загрузка матчей с {self.base_url}")
-            response = self.session.get(self.base_url, timeout=15)
-            response.raise_for_status()
-            response.encoding = 'utf-8'
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            matches = []
-            # Ищем все ссылки на матчи
-            links = soup.find_all('a', href=re.compile(r'/online/\d+'))
-
-            seen_urls = set()
-            for link in links:
-                title = link.get_text(strip=True)
-                if not title:
-                    # Если текст пустой, ищем в дочерних элементах
-                    title_parts = []
-                    for child in link.descendants:
-                        if isinstance(child, str) and child.strip():
-                            title_parts.append(child.strip())
-                    title = ' '.join(title_parts)
-                
-                url = link.get('href')
-                if not url:
-                    continue
-                    
-                if not url.startswith('http'):
-                    url = self.base_url + url
-                
-                # Фильтруем только прямые трансляции
-                if title and url and url not in seen_urls:
-                    if re.search(r'/online/\d+-', url):
-                        matches.append({'title': title, 'url': url})
-                        seen_urls.add(url)
-                        print(f"[PARSER] Найден матч: {title}")
+            with trace.stage('page_fetch'):
+                with self.session.get(url, headers=self._conditional_headers(url),
+                                      timeout=15, stream=True) as response:
+                    response.raise_for_status()
+                    for chunk in response.iter_content(STREAM_CHUNK_SIZE):
+                        if not reader.feed(chunk):
+                            break
+        except Exception:
+            self._record_mirror(url, started, False)
+            raise
+        self._record_mirror(url, started, True)
+        body = reader.body
+        trace.add_bytes(len(body))
+        return self._page_result(url, response.status_code, response.headers,
+                                 body, trace.timed('page_parse', parse))
+
+    def get_matches(self, trace=None):
+        """
+        Args:
+            trace: ScrapeTrace для замеров (по умолчанию создается новый)
+        """
+        trace = trace or ScrapeTrace('matches')
+        try:
+            base_url = self.base_url
+            print(f"[PARSER] Загрузка матчей с {base_url}")
+            matches = self._fetch_page(base_url, self._parse_matches, trace, MatchListEnd())
             
             print(f"[PARSER] Всего найдено {len(matches)} матчей")
+            trace.finish(len(matches))
             return matches
         except Exception as e:
             print(f"[PARSER] Ошибка при получении матчей: {e}")
+            trace.finish(0)
             return []
 
-    def get_links(self, match_url):
+    def get_links(self, match_url, trace=None):
+        """
+        Args:
+            match_url: URL страницы матча
+            trace: ScrapeTrace для замеров (по умолчанию создается новый)
+        """
+        trace = trace or ScrapeTrace('links')
         try:
+            match_url = self._rebase_url(match_url)
             print(f"[PARSER] Получение ссылок для: {match_url}")
-            links = []
             
             # 1. Получаем основную страницу матча
-            main_resp = self.session.get(match_url, timeout=15)
-            main_resp.raise_for_status()
-            main_resp.encoding = 'utf-8'
-            main_html = main_resp.text
-            
-            # Ищем заголовок матча
-            soup = BeautifulSoup(main_html, 'html.parser')
-            title_tag = soup.find('h1') or soup.find('title')
-            match_title = title_tag.get_text(strip=True) if title_tag else 'Матч'
-            
-            # 2. Ищем iframe на странице матча
-            iframes = re.findall(r'<iframe[^>]+src=["\']([^"\']+)["\'][^>]*>', main_html, re.IGNORECASE)
-            for i, src in enumerate(iframes):
-                # Пропускаем служебные iframe
-                if any(x in src.lower() for x in ['google', 'yandex', 'cackle', 'vk.com', 'facebook', 'twitter', 'instagram', 'metrika', 'analytics']):
-                    continue
-                if src.startswith('//'): 
-                    src = 'https:' + src
-                elif src.startswith('/'):
-                    src = self.base_url + src
-                
-                # Проверяем доступность ссылки
-                if self._is_url_accessible(src):
-                    links.append({
-                        'type': 'web', 
-                        'title': f'Трансляция {i+1}', 
-                        'url': src,
-                        'source': 'iframe'
-                    })
-                    print(f"[PARSER] Найден iframe: {src[:100]}...")
-            
-            # 3. Ищем переменные с видео в скриптах
-            video_vars = re.findall(r'videoid\d+\s*=\s*[\'"](.*?)[\'"]', main_html, re.DOTALL)
-            for i, video_html in enumerate(video_vars):
-                src_match = re.search(r'src=["\'](.*?)["\']', video_html)
-                if src_match:
-                    url = src_match.group(1)
-                    if url.startswith('//'): 
-                        url = 'https:' + url
-                    elif url.startswith('/'):
-                        url = self.base_url + url
-                    
-                    if self._is_url_accessible(url):
-                        links.append({
-                            'type': 'web', 
-                            'title': f'Канал {i+1}', 
-                            'url': url,
-                            'source': 'script'
-                        })
-                        print(f"[PARSER] Найден видеопоток из скрипта: {url[:100]}...")
+            # 2-3. iframe и переменные с видео в скриптах, 5. сторонние плееры
+            candidates, external = self._fetch_page(match_url, self._parse_match_page, trace)
+            candidates = list(candidates)
+            trace.add_candidates(candidates + external)
             
             # 4. POST запрос к /player/ для получения дополнительных ссылок
-            newsid_match = re.search(r'/online/(\d+)-', match_url)
-            if newsid_match:
-                newsid = newsid_match.group(1)
+            newsid = self._extract_newsid(match_url)
+            if newsid:
                 player_url = f"{self.base_url}/player/"
                 data = {'newsid': newsid}
                 
-                headers = self.HEADERS.copy()
-                headers['Referer'] = match_url
-                headers['X-Requested-With'] = 'XMLHttpRequest'
-                headers['Content-Type'] = 'application/x-www-form-urlencoded; charset=UTF-8'
-                
                 try:
-                    player_resp = self.session.post(player_url, data=data, headers=headers, timeout=15)
-                    player_resp.raise_for_status()
-                    player_resp.encoding = 'utf-8'
-                    player_html = player_resp.text
-                    
-                    # Ищем Ace Stream ссылки
-                    acestream_pattern = r'acestream://([a-f0-9]{40})'
-                    ace_ids = re.findall(acestream_pattern, player_html)
-                    
-                    # Ищем ссылки Ace Stream с названиями
-                    soup_player = BeautifulSoup(player_html, 'html.parser')
-                    ace_tags = soup_player.find_all('a', href=re.compile(r'acestream://'))
-                    
-                    for tag in ace_tags:
-                        title = tag.get_text(strip=True) or "Ace Stream"
-                        href = tag.get('href')
-                        if href:
-                            links.append({
-                                'type': 'acestream', 
-                                'title': title, 
-                                'url': href,
-                                'source': 'player_api'
-                            })
-                            print(f"[PARSER] Найден Ace Stream: {title}")
-                    
-                    if not ace_tags and ace_ids:
-                        for i, ace_id in enumerate(ace_ids):
-                            links.append({
-                                'type': 'acestream', 
-                                'title': f'Ace Stream {i+1}', 
-                                'url': f'acestream://{ace_id}',
-                                'source': 'player_api'
-                            })
-                            print(f"[PARSER] Найден Ace Stream ID: {ace_id}")
-                    
-                    # Ищем дополнительные iframe в ответе /player/
-                    player_iframes = re.findall(r'<iframe[^>]+src=["\']([^"\']+)["\'][^>]*>', player_html, re.IGNORECASE)
-                    for i, src in enumerate(player_iframes):
-                        if src.startswith('//'): 
-                            src = 'https:' + src
-                        elif src.startswith('/'):
-                            src = self.base_url + src
-                        
-                        if self._is_url_accessible(src):
-                            links.append({
-                                'type': 'web', 
-                                'title': f'Доп. канал {i+1}', 
-                                'url': src,
-                                'source': 'player_iframe'
-                            })
-                            print(f"[PARSER] Найден доп. iframe: {src[:100]}...")
-                            
+                    with trace.stage('player_post'):
+                        player_resp = self.session.post(player_url, data=data, headers=self._player_headers(match_url), timeout=15)
+                        player_resp.raise_for_status()
+                    trace.add_bytes(len(player_resp.content))
+                    with trace.stage('player_parse'):
+                        player_resp.encoding = 'utf-8'
+                        player_candidates = self._player_candidates(*self._parse_player_html(player_resp.text))
+                    trace.add_candidates(player_candidates)
+                    candidates += player_candidates
                 except Exception as e:
                     print(f"[PARSER] Ошибка при запросе к /player/: {e}")
             
-            # 5. Ищем ссылки на сторонние плееры
-            # Паттерны для поиска URL плееров
-            player_patterns = [
-                r'https?://[^\s\'"]+\.php[^\s\'"]*',
-                r'https?://[^\s\'"]+/player[^\s\'"]*',
-                r'https?://[^\s\'"]+/embed/[^\s\'"]*',
-                r'https?://[^\s\'"]+/live/[^\s\'"]*',
-                r'https?://[^\s\'"]+/stream[^\s\'"]*',
-            ]
+            # 5. Ссылки на сторонние плееры идут после ссылок /player/
+            candidates += external
             
-            for pattern in player_patterns:
-                external_links = re.findall(pattern, main_html, re.IGNORECASE)
-                for url in external_links:
-                    # Фильтруем служебные URL
-                    if any(x in url.lower() for x in ['gooool365.org', 'yandex', 'google', 'schema.org', 'javascript']): 
-                        continue
-                    
-                    if self._is_url_accessible(url):
-                        links.append({
-                            'type': 'web', 
-                            'title': f'Плеер {len(links)+1}', 
-                            'url': url,
-                            'source': 'external'
-                        })
-                        print(f"[PARSER] Найден внешний плеер: {url[:100]}...")
-                        break  # Берем только первое совпадение каждого типа
+            # Проверяем всех кандидатов одновременно
+            with trace.stage('validation'):
+                accessible = self._validate_urls(self._probe_urls(candidates), trace)
+            with trace.stage('assemble'):
+                links = self._assemble_links(candidates, accessible)
             
             # 6. Убираем дубликаты
-            unique_links = []
-            seen_urls = set()
-            for link in links:
-                if link['url'] and link['url'] not in seen_urls:
-                    seen_urls.add(link['url'])
-                    unique_links.append(link)
+            with trace.stage('dedup'):
+                unique_links = self._unique_links(links)
             
             print(f"[PARSER] Всего найдено {len(unique_links)} уникальных ссылок")
+            trace.finish(len(unique_links))
             return unique_links
             
         except Exception as e:
             print(f"[PARSER] Ошибка при получении ссылок: {e}")
             import traceback
             traceback.print_exc()
+            trace.finish(0)
             return []
 
-    def _is_url_accessible(self, url):
-        """Проверяет доступность URL"""
+    def _host_semaphore(self, url):
+        """Семафор, ограничивающий число одновременных проверок одного хоста"""
+        host = urlparse(url).netloc.lower()
+        with self._host_lock:
+            if host not in self._host_semaphores:
+                self._host_semaphores[host] = threading.BoundedSemaphore(self.VALIDATION_PER_HOST)
+            return self._host_semaphores[host]
+
+    def _probe_lane(self, queue, results, deadline):
+        """
+        Проверять URL одного хоста из очереди по одному
+
+        На хост запускается не больше VALIDATION_PER_HOST полос, поэтому поток
+        пула (общий слот) не простаивает в ожидании занятого хоста. Семафор
+        хоста ограничивает одновременные вызовы _validate_urls из разных потоков.
+        После дедлайна (time.monotonic()) новые проверки не начинаются, а
+        таймаут каждой не выходит за дедлайн, поэтому поток освобождается вовремя
+        """
+        while True:
+            try:
+                url = queue.popleft()
+            except IndexError:
+                return
+            with self._host_semaphore(url):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                results[url] = self._is_url_accessible(url, min(self.PROBE_TIMEOUT, remaining))
+
+    def _validate_urls(self, urls, trace=None):
+        """
+        Проверяет доступность URL параллельно
+
+        Сначала используется общий кэш статусов, проверяются только промахи.
+        Проверки, не успевшие до VALIDATION_DEADLINE, считаются недоступными
+        и в кэш не попадают
+
+        Args:
+            urls: Список URL без повторов
+            trace: ScrapeTrace для учета исходов проверки
+
+        Returns:
+            Словарь url -> bool
+        """
+        if not urls:
+            return {}
+        
+        cache = get_cache()
+        accessible = cache.get_link_statuses(urls)
+        to_probe = [url for url in urls if url not in accessible]
+        if trace:
+            trace.add_probes(len(accessible), [], 0)
+        
+        if to_probe:
+            queues = {}
+            for url in to_probe:
+                queues.setdefault(urlparse(url).netloc.lower(), deque()).append(url)
+            results = {}
+            deadline = time.monotonic() + self.VALIDATION_DEADLINE
+            lanes = [
+                self._validation_pool.submit(self._probe_lane, queue, results, deadline)
+                for queue in queues.values()
+                for _ in range(min(self.VALIDATION_PER_HOST, len(queue)))
+            ]
+            _, not_done = wait(lanes, timeout=self.VALIDATION_DEADLINE)
+            for lane in not_done:
+                lane.cancel()
+            results = dict(results)
+            timed_out = len(to_probe) - len(results)
+            if timed_out:
+                print(f"[PARSER] Дедлайн проверки: {timed_out} ссылок не проверено")
+            if trace:
+                trace.add_probes(0, list(results.values()), timed_out)
+            
+            checked = {url: result for url, result in results.items() if result is not None}
+            cache.set_link_statuses(checked)
+            accessible.update(checked)
+        
+        return {url: accessible.get(url, False) for url in urls}
+
+    def _is_url_accessible(self, url, timeout=None):
+        """Проверяет доступность URL (None - хост отключен circuit breaker'ом)"""
         try:
             # Для тестирования берем только HEAD запрос
-            response = self.session.head(url, timeout=5, allow_redirects=True)
+            response = self.probe_session.head(url, timeout=timeout or self.PROBE_TIMEOUT, allow_redirects=True)
             return response.status_code == 200
+        except (CircuitOpenError, RateLimitedError):
+            return None
         except:
             return False
 
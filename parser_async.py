@@ -1,51 +1,573 @@
 #!/usr/bin/env python3
 """
-Асинхронная обертка над парсером для использования в API сервере
-Преобразует синхронные функции парсера в асинхронные
+Асинхронный движок парсера для API сервера и бота
+Запросы выполняются через aiohttp с общим пулом соединений,
+без отдельного потока на каждый запрос
 """
 
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
+import multiprocessing
+import threading
+import time
 import os
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlparse
+
+import aiohttp
+from prometheus_client import Counter
+
+from parser import GoooolExtractor, BodyReader, MatchListEnd, STREAM_CHUNK_SIZE, extract_page
+from redis_cache import get_cache
+from domain_monitor import get_domain_monitor
+from rate_limiter import CircuitOpenError, RateLimitedError, get_outbound_guard
+from scrape_trace import ScrapeTrace
+from http_pool import create_session
+
+PAGE_TIMEOUT = 15
+PROBE_TIMEOUT = 5
+
+# Процессов для разбора HTML (0 - разбор в event loop без пула)
+PARSE_WORKERS = int(os.getenv('PARSER_PROCESS_WORKERS', '0'))
+
+# Хеджирование запросов к зеркалам: включение, перцентиль задержки
+# основного зеркала, после которого уходит дублирующий запрос, и границы (сек)
+HEDGING_ENABLED = os.getenv('PARSER_HEDGING', '0') == '1'
+HEDGE_PERCENTILE = float(os.getenv('HEDGE_PERCENTILE', '90'))
+HEDGE_MIN_DELAY = float(os.getenv('HEDGE_MIN_DELAY', '0.2'))
+HEDGE_DEFAULT_DELAY = float(os.getenv('HEDGE_DEFAULT_DELAY', '2'))
+
+# Счетчики хеджирования: запросы, которые могли получить дубль, отправленные
+# дубли и победы дублей (доля дублей - fired / запросы)
+HEDGE_REQUESTS = Counter('futlive_parser_hedgeable_requests_total', 'Запросы к зеркалам с хеджированием')
+HEDGE_COUNTER = Counter('futlive_parser_hedges_total', 'Хедж-запросы к зеркалам gooool365', ['outcome'])
+
+
+class AsyncGoooolParser(GoooolExtractor):
+    """Асинхронный аналог GoooolParser на aiohttp"""
+
+    def __init__(self):
+        super().__init__()
+        self._session = None
+        self._session_loop = None
+        # Фоновые задачи: проверки, не успевшие к дедлайну, и возврат
+        # пробного слота breaker'а после отмены
+        self._background = set()
+        # Зеркала проверяются в фоне, base_url всегда указывает на лучшее
+        get_domain_monitor().start()
+
+    async def _get_session(self):
+        """
+        Получить общую сессию aiohttp
+
+        Сессия привязана к event loop, поэтому при смене loop создается заново
+        """
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            # Пул с кэшем DNS, keep-alive и общим SSL контекстом (см. http_pool)
+            self._session = create_session(self.HEADERS)
+            self._session_loop = loop
+            self._validation_semaphore = asyncio.Semaphore(self.VALIDATION_CONCURRENCY)
+            self._host_semaphores = {}
+        return self._session
+
+    async def close(self):
+        """Закрыть сессию и освободить соединения"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def _attempt(self, method, url, stop_factory=None, **kwargs):
+        """
+        Один запрос к сайту
+
+        Тело читается по кускам не больше MAX_PAGE_BYTES, недочитанное
+        соединение закрывается, а не возвращается в пул
+
+        Args:
+            stop_factory: Создает функцию ранней остановки чтения (см. BodyReader),
+                своя на каждую попытку, так как хранит состояние
+
+        Returns:
+            (status, headers, body)
+        """
+        session = await self._get_session()
+        # Очередь к хосту входит в таймаут страницы
+        queued = time.monotonic()
+        host = await self._before_request(url, PAGE_TIMEOUT)
+        started = time.monotonic()
+        timeout = aiohttp.ClientTimeout(total=max(PAGE_TIMEOUT - (started - queued), 0.001))
+        status = None
+        reader = BodyReader(stop=stop_factory() if stop_factory else None)
+        try:
+            async with session.request(method, url, timeout=timeout, **kwargs) as response:
+                status = response.status
+                response.raise_for_status()
+                async for chunk in response.content.iter_chunked(STREAM_CHUNK_SIZE):
+                    if not reader.feed(chunk):
+                        break
+                result = response.status, response.headers, reader.body
+        except asyncio.CancelledError:
+            # Отмена (проигравший хедж-запрос) - не ошибка хоста
+            self._cancel_request(host)
+            raise
+        except Exception:
+            await self._after_request(host, status)
+            self._record_mirror(url, started, False)
+            raise
+        await self._after_request(host, status)
+        self._record_mirror(url, started, True)
+        return result
+
+    async def _before_request(self, url, max_wait=None):
+        """
+        Общий лимитер и circuit breaker перед запросом к хосту
+
+        Args:
+            max_wait: Сколько можно ждать очереди к хосту (см. OutboundGuard)
+
+        Raises:
+            CircuitOpenError: Хост временно отключен
+            RateLimitedError: Очередь к хосту длиннее max_wait
+        """
+        host = urlparse(url).netloc.lower()
+        wait = await get_outbound_guard().before_request_async(host, max_wait)
+        if wait:
+            try:
+                await asyncio.sleep(wait)
+            except asyncio.CancelledError:
+                self._cancel_request(host)
+                raise
+        return host
+
+    async def _after_request(self, host, status):
+        """Учесть ответ хоста (status None - сетевая ошибка или таймаут)"""
+        await get_outbound_guard().after_request_async(host, status, status is None)
+
+    def _cancel_request(self, host):
+        """
+        Запрос к хосту отменен: ничего не записывать, только вернуть пробный
+        слот breaker'а. Вызывается из обработчика отмены, поэтому не ждет
+        """
+        self._in_background(get_outbound_guard().cancel_request_async(host))
+
+    def _in_background(self, coro):
+        """Запустить задачу в фоне, держа ссылку на нее до завершения"""
+        task = asyncio.ensure_future(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return task
+
+    def _hedge_delay(self, domain):
+        """Сколько ждать основное зеркало перед дублирующим запросом"""
+        delay = get_domain_monitor().latency_percentile(domain, HEDGE_PERCENTILE)
+        if delay is None:
+            return HEDGE_DEFAULT_DELAY
+        return max(delay, HEDGE_MIN_DELAY)
+
+    async def _request(self, method, url, **kwargs):
+        """
+        Запрос к сайту с хеджированием по зеркалам
+
+        Если основное зеркало не ответило за перцентиль своей задержки
+        (или ответило ошибкой), тот же запрос уходит на следующее зеркало.
+        Побеждает первый успешный ответ, второй запрос отменяется
+
+        Returns:
+            (status, headers, body)
+        """
+        monitor = get_domain_monitor()
+        domain = monitor.domain_for(url)
+        alternates = [mirror for mirror in monitor.ranked() if mirror != domain]
+        if not HEDGING_ENABLED or not domain or not alternates:
+            return await self._attempt(method, url, **kwargs)
+
+        HEDGE_REQUESTS.inc()
+        primary = asyncio.create_task(self._attempt(method, url, **kwargs))
+        # Незавершенные запросы отменяются при любом выходе, в том числе
+        # при отмене вызывающего, пока ждем основное зеркало
+        pending = {primary}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=self._hedge_delay(domain))
+            if done and primary.exception() is None:
+                return primary.result()
+
+            hedge_url = monitor.on_mirror(url, alternates[0])
+            print(f"[PARSER_ASYNC] Хедж-запрос: {hedge_url}")
+            HEDGE_COUNTER.labels(outcome='fired').inc()
+            hedge = asyncio.create_task(self._attempt(method, hedge_url, **kwargs))
+
+            pending = pending | {hedge}
+            error = primary.exception() if done else None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            HEDGE_COUNTER.labels(outcome='won').inc()
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _fetch_page(self, url, kind, trace, stop_factory=None):
+        """
+        Условный GET страницы сайта
+
+        Отправляет сохраненные ETag/Last-Modified и возвращает прошлый
+        результат разбора, если страница не изменилась
+
+        Args:
+            url: URL страницы
+            kind: Вид страницы для разбора ('matches' или 'match_page')
+            trace: ScrapeTrace для замеров
+            stop_factory: Ранняя остановка чтения (см. _attempt)
+        """
+        with trace.stage('page_fetch'):
+            status, headers, body = await self._request(
+                'GET', url, stop_factory=stop_factory, headers=self._conditional_headers(url)
+            )
+        trace.add_bytes(len(body))
+
+        found, result, digest = self._cached_page(url, status, body)
+        if status == 304 and found:
+            return result
+        if not found:
+            result = await self._extract(kind, body, trace, 'page_parse')
+        self._remember_page(url, headers, digest, result)
+        return result
+
+    async def _extract(self, kind, body, trace, stage):
+        """
+        Разбор тела ответа: в пуле процессов, если он включен
+
+        В пул уходят байты страницы, обратно приходит только результат разбора
+        """
+        pool = get_parse_pool()
+        with trace.stage(stage):
+            if pool is None:
+                return self._extract_body(kind, body)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(pool, extract_page, kind, body, self.base_url)
+
+    async def get_matches(self, trace=None):
+        """
+        Args:
+            trace: ScrapeTrace для замеров (по умолчанию создается новый)
+        """
+        trace = trace or ScrapeTrace('matches')
+        try:
+            base_url = self.base_url
+            print(f"[PARSER_ASYNC] Загрузка матчей с {base_url}")
+            # Главную дочитываем только до конца списка матчей
+            matches = await self._fetch_page(base_url, 'matches', trace, MatchListEnd)
+
+            print(f"[PARSER_ASYNC] Всего найдено {len(matches)} матчей")
+            trace.finish(len(matches))
+            return matches
+        except Exception as e:
+            print(f"[PARSER_ASYNC] Ошибка при получении матчей: {e}")
+            trace.finish(0)
+            return []
+
+    async def get_links(self, match_url, trace=None, on_progress=None, budget=None, on_late=None):
+        """
+        Args:
+            match_url: URL страницы матча
+            trace: ScrapeTrace для замеров (по умолчанию создается новый)
+            on_progress: Функция(links), вызывается с уже подтвержденными
+                ссылками каждый раз, когда их становится больше
+            budget: Сколько секунд вызывающий ждет ссылки: проверки
+                заканчиваются не позже (и не позже VALIDATION_DEADLINE
+                после загрузки страницы)
+            on_late: Функция(links), вызывается в фоне с полным списком,
+                когда дозавершатся проверки, не успевшие к дедлайну
+        """
+        trace = trace or ScrapeTrace('links')
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        try:
+            match_url = self._rebase_url(match_url)
+            print(f"[PARSER_ASYNC] Получение ссылок для: {match_url}")
+
+            # 1. Получаем основную страницу матча
+            candidates, external = await self._fetch_page(match_url, 'match_page', trace)
+            trace.add_candidates(candidates + external)
+            deadline = loop.time() + self.VALIDATION_DEADLINE
+            if budget is not None:
+                deadline = min(deadline, started + budget)
+
+            player_candidates = []
+            accessible = {}
+            # Дозавершения проверок в фоне (результат - статусы {url: bool})
+            late = []
+
+            def report(statuses=None):
+                """Учесть результаты проверки и сообщить промежуточный список"""
+                if statuses:
+                    accessible.update(statuses)
+                if on_progress:
+                    on_progress(self._unique_links(
+                        self._assemble_links(candidates + player_candidates + external, accessible)
+                    ))
+
+            # 2-3. iframe и скрипты проверяем, пока идет запрос к /player/
+            page_check = asyncio.create_task(trace.measure(
+                'page_validation',
+                self._validate_urls(self._probe_urls(candidates + external), deadline, trace, report, late)
+            ))
+
+            # 4. POST запрос к /player/ для получения дополнительных ссылок
+            newsid = self._extract_newsid(match_url)
+            if newsid:
+                try:
+                    with trace.stage('player_post'):
+                        _, _, body = await self._request(
+                            'POST',
+                            f"{self.base_url}/player/",
+                            data={'newsid': newsid},
+                            headers=self._player_headers(match_url)
+                        )
+                    trace.add_bytes(len(body))
+                    player_candidates = self._player_candidates(
+                        *await self._extract('player', body, trace, 'player_parse')
+                    )
+                    trace.add_candidates(player_candidates)
+                    # Ace Stream ссылки не требуют проверки
+                    report()
+                except Exception as e:
+                    print(f"[PARSER_ASYNC] Ошибка при запросе к /player/: {e}")
+
+            accessible.update(await trace.measure(
+                'player_validation',
+                self._validate_urls(self._probe_urls(player_candidates), deadline, trace, report, late)
+            ))
+            accessible.update(await page_check)
+
+            # 5. Сторонние плееры идут после ссылок /player/
+            with trace.stage('assemble'):
+                links = self._assemble_links(candidates + player_candidates + external, accessible)
+
+            # 6. Убираем дубликаты
+            with trace.stage('dedup'):
+                unique_links = self._unique_links(links)
+
+            if late and on_late:
+                self._in_background(self._report_late(
+                    late, accessible, candidates + player_candidates + external, on_late
+                ))
+
+            print(f"[PARSER_ASYNC] Всего найдено {len(unique_links)} уникальных ссылок")
+            trace.finish(len(unique_links))
+            return unique_links
+
+        except Exception as e:
+            print(f"[PARSER_ASYNC] Ошибка при получении ссылок: {e}")
+            trace.finish(0)
+            return []
+
+    async def _probe(self, url):
+        """
+        Проверка одного URL с лимитом на хост и общим лимитом
+
+        Сначала берется семафор хоста: проверка, ждущая занятый хост,
+        не держит общий слот и не мешает проверкам других хостов.
+        Семафор хоста живет, пока есть его проверки: хосты ссылок
+        разные у каждого матча, и словарь не копит простаивающие
+        """
+        host = urlparse(url).netloc.lower()
+        entry = self._host_semaphores.get(host)
+        if entry is None:
+            # [семафор, проверок хоста в работе и в очереди]
+            entry = self._host_semaphores[host] = [asyncio.Semaphore(self.VALIDATION_PER_HOST), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                async with self._validation_semaphore:
+                    return await self._is_url_accessible(url)
+        finally:
+            entry[1] -= 1
+            if not entry[1] and self._host_semaphores.get(host) is entry:
+                del self._host_semaphores[host]
+
+    async def _report_late(self, late, accessible, candidates, on_late):
+        """Дождаться проверок, не успевших к дедлайну, и сообщить полный список ссылок"""
+        try:
+            for statuses in await asyncio.gather(*late):
+                accessible.update(statuses)
+            on_late(self._unique_links(self._assemble_links(candidates, accessible)))
+        except Exception as e:
+            print(f"[PARSER_ASYNC] Ошибка при дозавершении проверок: {e}")
+
+    async def _validate_urls(self, urls, deadline, trace=None, on_result=None, late=None):
+        """
+        Проверяет доступность URL одновременно
+
+        Сначала используется общий кэш статусов, проверяются только промахи
+
+        Args:
+            urls: Список URL без повторов
+            deadline: Момент loop.time(), после которого проверки отменяются
+            trace: ScrapeTrace для учета исходов проверки
+            on_result: Функция({url: bool}), вызывается для статусов из кэша
+                и для каждой завершенной проверки
+            late: Список, в который добавляется задача дозавершения проверок,
+                не успевших к дедлайну (ее результат - статусы {url: bool})
+
+        Returns:
+            Словарь url -> bool (не успевшие проверки считаются недоступными,
+            они дозавершаются в фоне и сохраняют статус в кэш)
+        """
+        if not urls:
+            return {}
+        await self._get_session()
+
+        cache = get_cache()
+        accessible = await asyncio.to_thread(cache.get_link_statuses, urls)
+        to_probe = [url for url in urls if url not in accessible]
+        if trace:
+            trace.add_probes(len(accessible), [], 0)
+        if on_result and accessible:
+            on_result(dict(accessible))
+
+        if to_probe:
+            loop = asyncio.get_running_loop()
+            tasks = {asyncio.create_task(self._probe(url)): url for url in to_probe}
+            pending = set(tasks)
+            results = []
+            checked = {}
+            while pending and deadline > loop.time():
+                done, pending = await asyncio.wait(
+                    pending, timeout=deadline - loop.time(), return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    result = task.result()
+                    results.append(result)
+                    if result is not None:
+                        checked[tasks[task]] = result
+                        if on_result:
+                            on_result({tasks[task]: result})
+            if pending:
+                print(f"[PARSER_ASYNC] Дедлайн проверки: {len(pending)} ссылок не проверено, дозавершаем в фоне")
+                finish = self._in_background(self._finish_probes(tasks, pending))
+                if late is not None:
+                    late.append(finish)
+            if trace:
+                trace.add_probes(0, results, len(pending))
+
+            await asyncio.to_thread(cache.set_link_statuses, checked)
+            accessible.update(checked)
+
+        return {url: accessible.get(url, False) for url in urls}
+
+    async def _finish_probes(self, tasks, pending):
+        """
+        Дождаться проверок, не успевших к дедлайну, и сохранить статусы в кэш
+
+        Returns:
+            Статусы дозавершенных проверок {url: bool}
+        """
+        done, _ = await asyncio.wait(pending)
+        checked = {
+            tasks[task]: task.result() for task in done
+            if not task.cancelled() and task.exception() is None and task.result() is not None
+        }
+        if checked:
+            await asyncio.to_thread(get_cache().set_link_statuses, checked)
+        return checked
+
+    async def _is_url_accessible(self, url):
+        """Проверяет доступность URL (None - хост отключен circuit breaker'ом)"""
+        try:
+            # Очередь к хосту не дольше самой проверки
+            host = await self._before_request(url, PROBE_TIMEOUT)
+        except (CircuitOpenError, RateLimitedError):
+            return None
+
+        status = None
+        try:
+            session = await self._get_session()
+            timeout = aiohttp.ClientTimeout(total=PROBE_TIMEOUT)
+            async with session.head(url, timeout=timeout, allow_redirects=True) as response:
+                status = response.status
+        except asyncio.CancelledError:
+            self._cancel_request(host)
+            raise
+        except Exception:
+            pass
+        await self._after_request(host, status)
+        return status == 200
+
 
 # Глобальный парсер
 _parser = None
-_executor = ThreadPoolExecutor(max_workers=3)
+
+# Фоновый event loop для вызова из синхронного кода (Flask)
+_loop = None
+_loop_lock = threading.Lock()
+
+# Пул процессов для разбора HTML (свой в каждом воркере gunicorn)
+_parse_pool = None
+_parse_pool_pid = None
+_parse_pool_lock = threading.Lock()
+
+def get_parse_pool():
+    """Пул процессов для разбора HTML или None, если он выключен"""
+    global _parse_pool, _parse_pool_pid
+    if PARSE_WORKERS <= 0:
+        return None
+    with _parse_pool_lock:
+        if _parse_pool is None or _parse_pool_pid != os.getpid():
+            # fork из процесса с потоками небезопасен
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            _parse_pool = ProcessPoolExecutor(
+                max_workers=PARSE_WORKERS,
+                mp_context=multiprocessing.get_context(method)
+            )
+            _parse_pool_pid = os.getpid()
+            print(f"[PARSER_ASYNC] Разбор HTML в пуле из {PARSE_WORKERS} процессов")
+        return _parse_pool
 
 def get_parser():
     """Получить или создать экземпляр парсера"""
     global _parser
     if _parser is None:
-        from parser import GoooolParser
-        _parser = GoooolParser()
-        print("[PARSER_ASYNC] Используем реальный парсер")
+        _parser = AsyncGoooolParser()
+        print("[PARSER_ASYNC] Используем асинхронный парсер")
     return _parser
 
-async def get_matches():
+def _get_background_loop():
+    """Получить фоновый event loop, работающий в отдельном потоке"""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=_loop.run_forever, name='parser-loop', daemon=True)
+            thread.start()
+        return _loop
+
+def submit(coro):
+    """Запустить корутину в фоновом event loop, не дожидаясь результата"""
+    return asyncio.run_coroutine_threadsafe(coro, _get_background_loop())
+
+def run_sync(coro, timeout=None):
+    """
+    Выполнить корутину из синхронного кода
+
+    Все вызовы идут через один фоновый event loop, поэтому пул
+    соединений парсера общий для всех запросов процесса
+    """
+    return submit(coro).result(timeout)
+
+async def get_matches(trace=None):
     """Асинхронно получить матчи"""
-    loop = asyncio.get_event_loop()
-    parser = get_parser()
-    
-    # Запускаем синхронную функцию в отдельном потоке
-    matches = await loop.run_in_executor(
-        _executor,
-        parser.get_matches
-    )
-    
-    return matches
-
-async def get_match_links(match_url):
+    return await get_parser().get_matches(trace)
+
+async def get_match_links(match_url, trace=None):
     """Асинхронно получить ссылки для матча"""
-    loop = asyncio.get_event_loop()
-    parser = get_parser()
-    
-    # Запускаем синхронную функцию в отдельном потоке
-    links = await loop.run_in_executor(
-        _executor,
-        parser.get_links,
-        match_url
-    )
-    
+    links = await get_parser().get_links(match_url, trace)
+
     # Преобразуем список ссылок в словарь для API
     links_dict = {}
     for i, link in enumerate(links):
@@ -53,33 +575,35 @@ async def get_match_links(match_url):
         url = link.get('url', '')
         if url:
             links_dict[title] = url
-    
+
     return links_dict
 
 async def test_parser():
     """Тестирование парсера"""
     print("🧪 Тестирование асинхронного парсера...")
-    
+
     try:
         matches = await get_matches()
         print(f"✅ Найдено матчей: {len(matches)}")
-        
+
         if matches:
             first_match = matches[0]
             print(f"📺 Первый матч: {first_match.get('title')}")
-            
+
             links = await get_match_links(first_match.get('url'))
             print(f"✅ Найдено ссылок: {len(links)}")
-            
+
             for title, url in list(links.items())[:3]:
                 print(f"  - {title}: {url[:60]}...")
         else:
             print("⚠️ Матчи не найдены")
-            
+
     except Exception as e:
         print(f"❌ Ошибка: {e}")
         import traceback
         traceback.print_exc()
+    finally:
+        await get_parser().close()
 
 if __name__ == "__main__":
     asyncio.run(test_parser())
@@ -0,0 +1,44 @@
+"""
+Конфигурация Prometheus для всех процессов Backend
+
+Воркеры gunicorn/uvicorn и бот запускаются вместе (start_backend.sh) и
+пишут метрики в общий каталог PROMETHEUS_MULTIPROC_DIR (multiprocess режим
+prometheus_client). /metrics любого воркера отдает сумму по всем процессам,
+в том числе замеры обхода из процесса, который держит блокировку crawler
+"""
+
+import os
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, generate_latest, multiprocess
+
+MULTIPROC_DIR = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+
+
+def is_multiprocess() -> bool:
+    """Включен ли общий для процессов сбор метрик"""
+    return bool(MULTIPROC_DIR)
+
+
+def render_metrics():
+    """
+    Метрики для ответа /metrics
+
+    Returns:
+        (тело ответа, Content-Type)
+    """
+    if not is_multiprocess():
+        return generate_latest(), CONTENT_TYPE_LATEST
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid=None):
+    """
+    Убрать живые gauge завершившегося процесса (по умолчанию текущего)
+
+    Вызывается при остановке процесса, иначе его подписки и соединения
+    продолжат учитываться в сумме
+    """
+    if is_multiprocess():
+        multiprocess.mark_process_dead(pid or os.getpid())
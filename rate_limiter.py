@@ -0,0 +1,492 @@
+#!/usr/bin/env python3
+"""
+Ограничение исходящего трафика парсера
+Token bucket и circuit breaker на каждый хост, состояние общее для всех
+процессов через Redis (воркеры gunicorn и бот ведут себя как один клиент)
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+import weakref
+from typing import Dict, Optional
+
+import redis.asyncio
+
+from redis_cache import get_cache
+
+logger = logging.getLogger(__name__)
+
+# Лимиты запросов (в секунду и размер пачки) для зеркал сайта и прочих хостов
+SITE_RATE = float(os.getenv('RATE_LIMIT_SITE', '5'))
+SITE_BURST = int(os.getenv('RATE_LIMIT_SITE_BURST', '10'))
+DEFAULT_RATE = float(os.getenv('RATE_LIMIT_DEFAULT', '10'))
+DEFAULT_BURST = int(os.getenv('RATE_LIMIT_DEFAULT_BURST', '20'))
+
+# Дольше скольких секунд не ждать своей очереди к хосту: запрос
+# отклоняется (RateLimitedError), а долг токенов не растет
+RATE_LIMIT_MAX_WAIT = float(os.getenv('RATE_LIMIT_MAX_WAIT', '5'))
+
+# Circuit breaker: ошибок подряд в окне до размыкания, окно и пауза (сек)
+BREAKER_THRESHOLD = int(os.getenv('BREAKER_THRESHOLD', '5'))
+BREAKER_WINDOW = int(os.getenv('BREAKER_WINDOW', '60'))
+BREAKER_COOLDOWN = int(os.getenv('BREAKER_COOLDOWN', '30'))
+
+# Token bucket с резервированием: токены могут уйти в минус,
+# вызывающий ждет возвращенное число миллисекунд. Если ждать пришлось бы
+# дольше ARGV[3] мс, токен не списывается и возвращается -1
+_TOKEN_BUCKET_LUA = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) * 1000 + math.floor(tonumber(now_parts[2]) / 1000)
+local data = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(data[1]) or burst
+local ts = tonumber(data[2]) or now
+tokens = math.min(burst, tokens + (now - ts) * rate / 1000)
+local wait = 0
+if tokens < 1 then
+    wait = math.ceil((1 - tokens) * 1000 / rate)
+end
+if wait > tonumber(ARGV[3]) then
+    redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+    return -1
+end
+tokens = tokens - 1
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst * 1000 / rate) + 1000)
+return wait
+"""
+
+# Circuit breaker: пропустить ли запрос (в полуоткрытом состоянии - один пробный)
+_BREAKER_ALLOW_LUA = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    if redis.call('SET', KEYS[3], '1', 'NX', 'EX', ARGV[1]) then
+        return 1
+    end
+    return 0
+end
+return 1
+"""
+
+# Успех: сбросить состояние хоста, только если оно есть (обычно ничего не пишется)
+_BREAKER_SUCCESS_LUA = """
+if redis.call('EXISTS', KEYS[1], KEYS[2], KEYS[3], KEYS[4]) == 0 then
+    return 0
+end
+return redis.call('DEL', KEYS[1], KEYS[2], KEYS[3], KEYS[4])
+"""
+
+# Ошибка: посчитать в окне и при превышении порога (или ошибке пробного
+# запроса) разомкнуть. Возвращает 1, если breaker разомкнут
+_BREAKER_FAILURE_LUA = """
+local failures = redis.call('INCR', KEYS[1])
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+if failures < tonumber(ARGV[1]) and redis.call('EXISTS', KEYS[3]) == 0 then
+    return 0
+end
+redis.call('SET', KEYS[2], '1', 'EX', ARGV[3])
+redis.call('SET', KEYS[3], '1', 'EX', tonumber(ARGV[3]) + tonumber(ARGV[2]))
+redis.call('DEL', KEYS[1], KEYS[4])
+return 1
+"""
+
+# Клиенты redis.asyncio по event loop'ам: event loop -> (клиент, скрипты)
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def _run_script(cache, scripts: Dict, source: str, keys, args):
+    """Выполнить Lua-скрипт синхронным клиентом кэша"""
+    script = scripts.get(source)
+    if script is None:
+        script = scripts[source] = cache.redis_client.register_script(source)
+    return script(keys=keys, args=args)
+
+
+async def _run_script_async(cache, source: str, keys, args):
+    """
+    Выполнить Lua-скрипт через redis.asyncio, не занимая поток
+
+    Клиент свой на каждый event loop, с параметрами соединения кэша
+    """
+    loop = asyncio.get_running_loop()
+    entry = _async_clients.get(loop)
+    if entry is None:
+        kwargs = cache.redis_client.connection_pool.connection_kwargs
+        client = redis.asyncio.Redis(
+            host=kwargs.get('host', 'localhost'),
+            port=kwargs.get('port', 6379),
+            db=kwargs.get('db', 0),
+            password=kwargs.get('password'),
+            decode_responses=True,
+            socket_connect_timeout=5
+        )
+        entry = _async_clients[loop] = (client, {})
+    client, scripts = entry
+    script = scripts.get(source)
+    if script is None:
+        script = scripts[source] = client.register_script(source)
+    return await script(keys=keys, args=args)
+
+
+class CircuitOpenError(Exception):
+    """Хост временно отключен circuit breaker'ом"""
+
+
+class RateLimitedError(Exception):
+    """Очередь запросов к хосту длиннее допустимого ожидания"""
+
+
+def is_failure_status(status: int) -> bool:
+    """Ответ, который считается ошибкой хоста (троттлинг или сбой сервера)"""
+    return status == 429 or status >= 500
+
+
+class HostRateLimiter:
+    """Token bucket на каждый хост"""
+
+    def __init__(self, site_hosts=()):
+        """
+        Args:
+            site_hosts: Хосты зеркал сайта (для них отдельный, более строгий лимит)
+        """
+        self.cache = get_cache()
+        self.site_hosts = set(site_hosts)
+        self._scripts: Dict = {}
+        self._local: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def _limits(self, host: str):
+        if host in self.site_hosts:
+            return SITE_RATE, SITE_BURST
+        return DEFAULT_RATE, DEFAULT_BURST
+
+    @staticmethod
+    def _max_wait(max_wait: Optional[float]) -> float:
+        return RATE_LIMIT_MAX_WAIT if max_wait is None else min(max_wait, RATE_LIMIT_MAX_WAIT)
+
+    def _script_args(self, host: str, max_wait: float):
+        rate, burst = self._limits(host)
+        return [f'ratelimit:{host}'], [rate, burst, int(max_wait * 1000)]
+
+    def reserve(self, host: str, max_wait: Optional[float] = None) -> float:
+        """
+        Зарезервировать запрос к хосту
+
+        Args:
+            host: Хост
+            max_wait: Сколько вызывающий готов ждать (не больше RATE_LIMIT_MAX_WAIT)
+
+        Returns:
+            Сколько секунд подождать перед запросом
+
+        Raises:
+            RateLimitedError: Ждать пришлось бы дольше max_wait
+        """
+        max_wait = self._max_wait(max_wait)
+        if self.cache.is_connected():
+            try:
+                wait = int(_run_script(self.cache, self._scripts, _TOKEN_BUCKET_LUA,
+                                       *self._script_args(host, max_wait))) / 1000
+                return self._checked(host, wait, max_wait)
+            except RateLimitedError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Ошибка rate limiter в Redis: {e}")
+        return self._reserve_local(host, max_wait)
+
+    async def reserve_async(self, host: str, max_wait: Optional[float] = None) -> float:
+        """То же, что reserve, для event loop (Redis через redis.asyncio)"""
+        max_wait = self._max_wait(max_wait)
+        if self.cache.is_connected():
+            try:
+                wait = int(await _run_script_async(self.cache, _TOKEN_BUCKET_LUA,
+                                                   *self._script_args(host, max_wait))) / 1000
+                return self._checked(host, wait, max_wait)
+            except RateLimitedError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Ошибка rate limiter в Redis: {e}")
+        return self._reserve_local(host, max_wait)
+
+    @staticmethod
+    def _checked(host: str, wait: float, max_wait: float) -> float:
+        if wait < 0:
+            raise RateLimitedError(f"Очередь запросов к {host} длиннее {max_wait:.1f}s")
+        return wait
+
+    def _reserve_local(self, host: str, max_wait: float) -> float:
+        """Локальный token bucket, если Redis недоступен"""
+        rate, burst = self._limits(host)
+        with self._lock:
+            now = time.monotonic()
+            bucket = self._local.setdefault(host, {'tokens': burst, 'ts': now})
+            bucket['tokens'] = min(burst, bucket['tokens'] + (now - bucket['ts']) * rate)
+            bucket['ts'] = now
+            wait = (1 - bucket['tokens']) / rate if bucket['tokens'] < 1 else 0.0
+            if wait <= max_wait:
+                bucket['tokens'] -= 1
+                return wait
+        return self._checked(host, -1, max_wait)
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker на каждый хост
+
+    Закрыт -> после BREAKER_THRESHOLD ошибок в окне размыкается на
+    BREAKER_COOLDOWN секунд (запросы сразу отклоняются) -> полуоткрыт:
+    пропускается один пробный запрос, успех замыкает, ошибка снова размыкает
+
+    Каждая операция в Redis - один Lua-скрипт, общий для синхронного пути
+    и event loop (методы *_async)
+    """
+
+    def __init__(self):
+        self.cache = get_cache()
+        self._scripts: Dict = {}
+        self._local: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _keys(host: str):
+        prefix = f'breaker:{host}'
+        return f'{prefix}:failures', f'{prefix}:open', f'{prefix}:half_open', f'{prefix}:trial'
+
+    def _calls(self, host: str, ok: Optional[bool] = None):
+        """Скрипт и аргументы операции: проверка (ok None), успех или ошибка"""
+        keys = self._keys(host)
+        if ok is None:
+            return _BREAKER_ALLOW_LUA, list(keys[1:]), [BREAKER_COOLDOWN]
+        if ok:
+            return _BREAKER_SUCCESS_LUA, list(keys), []
+        return _BREAKER_FAILURE_LUA, list(keys), [BREAKER_THRESHOLD, BREAKER_WINDOW, BREAKER_COOLDOWN]
+
+    def allow(self, host: str) -> bool:
+        """Можно ли сейчас отправить запрос к хосту"""
+        if self.cache.is_connected():
+            try:
+                return bool(_run_script(self.cache, self._scripts, *self._calls(host)))
+            except Exception as e:
+                logger.error(f"❌ Ошибка circuit breaker в Redis: {e}")
+                return True
+        return self._allow_local(host)
+
+    async def allow_async(self, host: str) -> bool:
+        """То же, что allow, для event loop"""
+        if self.cache.is_connected():
+            try:
+                return bool(await _run_script_async(self.cache, *self._calls(host)))
+            except Exception as e:
+                logger.error(f"❌ Ошибка circuit breaker в Redis: {e}")
+                return True
+        return self._allow_local(host)
+
+    def _allow_local(self, host: str) -> bool:
+        with self._lock:
+            state = self._local.get(host)
+            if not state:
+                return True
+            now = time.monotonic()
+            if state.get('open_until', 0) > now:
+                return False
+            if state.get('half_open'):
+                if state.get('trial_until', 0) > now:
+                    return False
+                state['trial_until'] = now + BREAKER_COOLDOWN
+            return True
+
+    def release(self, host: str):
+        """
+        Запрос отменен без результата: освободить пробный слот
+        полуоткрытого состояния, не считая ни успехом, ни ошибкой
+        """
+        if self.cache.is_connected():
+            try:
+                self.cache.redis_client.delete(self._keys(host)[3])
+            except Exception as e:
+                logger.error(f"❌ Ошибка circuit breaker в Redis: {e}")
+            return
+        self._release_local(host)
+
+    async def release_async(self, host: str):
+        """То же, что release, для event loop"""
+        if self.cache.is_connected():
+            try:
+                await _run_script_async(self.cache, "return redis.call('DEL', KEYS[1])",
+                                        [self._keys(host)[3]], [])
+            except Exception as e:
+                logger.error(f"❌ Ошибка circuit breaker в Redis: {e}")
+            return
+        self._release_local(host)
+
+    def _release_local(self, host: str):
+        with self._lock:
+            state = self._local.get(host)
+            if state and state.get('half_open'):
+                state.pop('trial_until', None)
+
+    def record(self, host: str, ok: bool):
+        """Учесть результат запроса к хосту"""
+        if self.cache.is_connected():
+            try:
+                self._opened(host, _run_script(self.cache, self._scripts, *self._calls(host, ok)), ok)
+            except Exception as e:
+                logger.error(f"❌ Ошибка circuit breaker в Redis: {e}")
+            return
+        self._record_local(host, ok)
+
+    async def record_async(self, host: str, ok: bool):
+        """То же, что record, для event loop"""
+        if self.cache.is_connected():
+            try:
+                self._opened(host, await _run_script_async(self.cache, *self._calls(host, ok)), ok)
+            except Exception as e:
+                logger.error(f"❌ Ошибка circuit breaker в Redis: {e}")
+            return
+        self._record_local(host, ok)
+
+    @staticmethod
+    def _opened(host: str, result, ok: bool):
+        if not ok and result:
+            logger.warning(f"⛔ Circuit breaker разомкнут для {host} на {BREAKER_COOLDOWN}s")
+
+    def _record_local(self, host: str, ok: bool):
+        with self._lock:
+            if ok:
+                self._local.pop(host, None)
+                return
+            now = time.monotonic()
+            state = self._local.setdefault(host, {'failures': 0, 'window_start': now})
+            if now - state.get('window_start', now) > BREAKER_WINDOW:
+                state['failures'] = 0
+                state['window_start'] = now
+            state['failures'] = state.get('failures', 0) + 1
+            if state['failures'] >= BREAKER_THRESHOLD or state.get('half_open'):
+                self._local[host] = {
+                    'open_until': now + BREAKER_COOLDOWN,
+                    'half_open': True,
+                    'failures': 0,
+                    'window_start': now
+                }
+                self._opened(host, True, False)
+
+    def state(self, host: str) -> str:
+        """Состояние для хоста: closed, open или half_open"""
+        failures_key, open_key, half_open_key, trial_key = self._keys(host)
+        if self.cache.is_connected():
+            try:
+                is_open, half_open = self.cache.redis_client.mget(open_key, half_open_key)
+                return 'open' if is_open else 'half_open' if half_open else 'closed'
+            except Exception:
+                return 'closed'
+        state = self._local.get(host) or {}
+        if state.get('open_until', 0) > time.monotonic():
+            return 'open'
+        return 'half_open' if state.get('half_open') else 'closed'
+
+
+class OutboundGuard:
+    """
+    Лимитер и circuit breaker для одного пути запросов
+
+    Синхронные методы - для парсера на requests, *_async - для event loop
+    парсера на aiohttp (без переходов в поток)
+    """
+
+    def __init__(self, site_hosts=()):
+        self.limiter = HostRateLimiter(site_hosts)
+        self.breaker = CircuitBreaker()
+
+    def before_request(self, host: str, max_wait: Optional[float] = None) -> float:
+        """
+        Проверить хост перед запросом
+
+        Args:
+            host: Хост
+            max_wait: Сколько вызывающий готов ждать очереди (например остаток таймаута)
+
+        Returns:
+            Сколько секунд подождать перед запросом
+
+        Raises:
+            CircuitOpenError: Хост временно отключен
+            RateLimitedError: Очередь к хосту длиннее max_wait
+        """
+        if not self.breaker.allow(host):
+            raise CircuitOpenError(f"Circuit breaker разомкнут для {host}")
+        try:
+            return self.limiter.reserve(host, max_wait)
+        except RateLimitedError:
+            # Запрос не состоится: пробный слот полуоткрытого breaker'а свободен
+            self.breaker.release(host)
+            raise
+
+    async def before_request_async(self, host: str, max_wait: Optional[float] = None) -> float:
+        """То же, что before_request, для event loop"""
+        if not await self.breaker.allow_async(host):
+            raise CircuitOpenError(f"Circuit breaker разомкнут для {host}")
+        try:
+            return await self.limiter.reserve_async(host, max_wait)
+        except RateLimitedError:
+            await self.breaker.release_async(host)
+            raise
+
+    @staticmethod
+    def _ok(status: Optional[int], error: bool) -> bool:
+        return not error and not (status and is_failure_status(status))
+
+    def after_request(self, host: str, status: Optional[int] = None, error: bool = False):
+        """
+        Учесть результат запроса
+
+        Args:
+            host: Хост
+            status: HTTP статус ответа (если ответ получен)
+            error: Запрос завершился сетевой ошибкой или таймаутом
+        """
+        self.breaker.record(host, self._ok(status, error))
+
+    async def after_request_async(self, host: str, status: Optional[int] = None, error: bool = False):
+        """То же, что after_request, для event loop"""
+        await self.breaker.record_async(host, self._ok(status, error))
+
+    def cancel_request(self, host: str):
+        """Запрос отменен до результата (например проигравший хедж-запрос)"""
+        self.breaker.release(host)
+
+    async def cancel_request_async(self, host: str):
+        """То же, что cancel_request, для event loop"""
+        await self.breaker.release_async(host)
+
+
+# Глобальный экземпляр
+_guard = None
+_guard_lock = threading.Lock()
+
+def get_outbound_guard() -> OutboundGuard:
+    """Получить общий ограничитель исходящих запросов"""
+    global _guard
+    with _guard_lock:
+        if _guard is None:
+            from urllib.parse import urlparse
+            from parser import GoooolExtractor
+            _guard = OutboundGuard(urlparse(url).netloc for url in GoooolExtractor.BASE_URLS)
+        return _guard
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    guard = get_outbound_guard()
+    host = 'example.com'
+    waits = [guard.before_request(host) for _ in range(DEFAULT_BURST + 3)]
+    print(f"Ожидание для последних запросов: {[round(w, 3) for w in waits[-4:]]}")
+
+    for _ in range(BREAKER_THRESHOLD):
+        guard.after_request(host, error=True)
+    print(f"Состояние после {BREAKER_THRESHOLD} ошибок: {guard.breaker.state(host)}")
@@ -6,15 +6,73 @@ Redis кэш для хранения матчей и каналов
 
 import redis
 import json
+import hashlib
 import logging
-from typing import Dict, List, Optional
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
 import time
+from collections import OrderedDict
 
 logger = logging.getLogger(__name__)
 
+# Публикация события: версия, запись в stream и рассылка через pub/sub
+# выполняются атомарно, поэтому версии в stream строго возрастают.
+# С KEYS[3] вместе с событием сохраняется снимок этой версии (ARGV[5] -
+# JSON снимка без открывающей скобки) и его метка KEYS[4] со временем
+# жизни ARGV[7] (0 - без TTL): событие не опережает снимок
+_PUBLISH_EVENT_LUA = """
+local version = redis.call('INCR', KEYS[1])
+if KEYS[3] then
+    local body = '{"version": ' .. version .. ', ' .. ARGV[5]
+    local ttl = tonumber(ARGV[7])
+    if ttl > 0 then
+        redis.call('SET', KEYS[3], body, 'EX', ttl)
+        redis.call('SET', KEYS[4], ARGV[6], 'EX', ttl)
+    else
+        redis.call('SET', KEYS[3], body)
+        redis.call('SET', KEYS[4], ARGV[6])
+    end
+end
+local event = '{"version": ' .. version .. ', "type": "' .. ARGV[1] .. '", "ts": ' .. ARGV[3] .. ', "data": ' .. ARGV[2] .. '}'
+redis.call('XADD', KEYS[2], 'MAXLEN', '~', ARGV[4], version .. '-0', 'event', event)
+redis.call('PUBLISH', KEYS[2], event)
+return version
+"""
+
+# Ссылка Ace Stream с content ID (40 hex)
+_ACE_URL_RE = re.compile(r'^acestream://([0-9a-f]{40})$')
+
+# Снять блокировку, только если она принадлежит владельцу
+_RELEASE_LOCK_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
 class RedisCache:
     """Класс для работы с Redis кэшем"""
     
+    # TTL статуса доступности ссылок (сек): доступные и недоступные отдельно
+    LINK_ALIVE_TTL = 600
+    LINK_DEAD_TTL = 120
+    
+    # Stream и канал pub/sub событий изменения матчей, сколько событий хранить
+    EVENTS_STREAM = 'events:matches'
+    EVENTS_MAXLEN = 1000
+    
+    # Сколько хранить запись реестра Ace Stream после последнего появления (сек)
+    ACE_REGISTRY_TTL = 7 * 24 * 3600
+    
+    # Сколько хранить снимок каналов матча после последнего обновления (сек):
+    # матчи, ушедшие из списка, не копятся в Redis
+    CHANNELS_SNAPSHOT_TTL = int(os.getenv('CHANNELS_SNAPSHOT_TTL', str(24 * 3600)))
+    
+    # Сколько разобранных снимков держать в памяти процесса
+    SNAPSHOT_MEMO_SIZE = int(os.getenv('SNAPSHOT_MEMO_SIZE', '512'))
+    
     def __init__(self, host='localhost', port=6379, db=0, password=None):
         """Инициализация Redis клиента"""
         try:
@@ -36,6 +94,13 @@ class RedisCache:
             self.redis_client = None
             self.connected = False
             self.local_cache = {}
+        self.link_stats = {'hits': 0, 'misses': 0}
+        self._publish_script = None
+        self._release_script = None
+        # Разобранные снимки: имя -> (метка, снимок) и снимки каналов
+        # с раскрытым реестром Ace Stream: ID матча -> (снимок, каналы)
+        self._snapshots = OrderedDict()
+        self._channel_views = OrderedDict()
     
     def is_connected(self) -> bool:
         """Проверить, подключен ли Redis"""
@@ -111,7 +176,7 @@ class RedisCache:
         Сохранить каналы матча в кэш
         
         Args:
-            match_id: ID матча
+            match_id: ID матча (newsid gooool365, стабилен между обновлениями)
             channels: Словарь каналов
             ttl: Время жизни в секундах
         
@@ -120,12 +185,14 @@ class RedisCache:
         """
         try:
             key = f'channels:{match_id}'
+            # Каналы Ace Stream хранятся ссылками на реестр
+            entries = self.pack_channels(channels, match_id)
             if self.connected:
-                data = json.dumps(channels, ensure_ascii=False)
+                data = json.dumps(entries, ensure_ascii=False)
                 self.redis_client.setex(key, ttl, data)
                 logger.info(f"💾 Каналы матча {match_id} сохранены в Redis ({len(channels)} шт)")
             else:
-                self.local_cache[key] = channels
+                self.local_cache[key] = entries
                 logger.info(f"💾 Каналы матча {match_id} сохранены в локальный кэш")
             return True
         except Exception as e:
@@ -137,7 +204,7 @@ class RedisCache:
         Получить каналы матча из кэша
         
         Args:
-            match_id: ID матча
+            match_id: ID матча (newsid gooool365)
         
         Returns:
             Словарь каналов или None
@@ -147,12 +214,12 @@ class RedisCache:
             if self.connected:
                 data = self.redis_client.get(key)
                 if data:
-                    channels = json.loads(data)
+                    channels = self.unpack_channels(json.loads(data))
                     logger.info(f"📦 Каналы матча {match_id} получены из Redis ({len(channels)} шт)")
                     return channels
             else:
                 if key in self.local_cache:
-                    channels = self.local_cache[key]
+                    channels = self.unpack_channels(self.local_cache[key])
                     logger.info(f"📦 Каналы матча {match_id} получены из локального кэша")
                     return channels
         except Exception as e:
@@ -174,6 +241,516 @@ class RedisCache:
             logger.error(f"❌ Ошибка при удалении каналов: {e}")
             return False
     
+    # ============ РЕЕСТР ACE STREAM ============
+    
+    @staticmethod
+    def ace_id(url: str) -> Optional[str]:
+        """Content ID из ссылки acestream:// или None"""
+        match = _ACE_URL_RE.match(url or '')
+        return match.group(1) if match else None
+    
+    def register_ace_channels(self, channels: Dict[str, str], match_id: Optional[int] = None) -> Dict[str, str]:
+        """
+        Учесть каналы Ace Stream в общем реестре
+        
+        Запись реестра ace:<content id> одна на все матчи: название (первое
+        встреченное), время первого и последнего появления и последний матч
+        
+        Args:
+            channels: Словарь название -> url (остальные ссылки пропускаются)
+            match_id: ID матча, на странице которого найдены каналы
+        
+        Returns:
+            Словарь content id -> название в реестре (пустой при ошибке)
+        """
+        found = {}
+        for title, url in channels.items():
+            content_id = self.ace_id(url)
+            if content_id is not None:
+                found[content_id] = title
+        if not found:
+            return {}
+        now = time.time()
+        try:
+            if self.connected:
+                pipe = self.redis_client.pipeline(transaction=False)
+                for content_id, title in found.items():
+                    key = f'ace:{content_id}'
+                    pipe.hsetnx(key, 'title', title)
+                    pipe.hsetnx(key, 'first_seen', now)
+                    pipe.hset(key, mapping={'last_seen': now, 'last_match': match_id or ''})
+                    pipe.expire(key, self.ACE_REGISTRY_TTL)
+                    pipe.hget(key, 'title')
+                results = pipe.execute()
+                return dict(zip(found, results[4::5]))
+            titles = {}
+            for content_id, title in found.items():
+                entry = self.local_cache.setdefault(f'ace:{content_id}', {'title': title, 'first_seen': now})
+                entry.update(last_seen=now, last_match=match_id or '')
+                titles[content_id] = entry['title']
+            return titles
+        except Exception as e:
+            logger.error(f"❌ Ошибка при сохранении реестра Ace Stream: {e}")
+            return {}
+    
+    def get_ace_channels(self, content_ids: List[str]) -> Dict[str, Dict]:
+        """
+        Записи реестра Ace Stream
+        
+        Returns:
+            Словарь content id -> {'title', 'first_seen', 'last_seen', 'last_match'}
+            только для найденных записей
+        """
+        channels = {}
+        if not content_ids:
+            return channels
+        try:
+            if self.connected:
+                pipe = self.redis_client.pipeline(transaction=False)
+                for content_id in content_ids:
+                    pipe.hgetall(f'ace:{content_id}')
+                entries = pipe.execute()
+            else:
+                entries = [self.local_cache.get(f'ace:{content_id}') for content_id in content_ids]
+            for content_id, entry in zip(content_ids, entries):
+                if entry:
+                    channels[content_id] = {
+                        'title': entry.get('title', ''),
+                        'first_seen': float(entry.get('first_seen', 0)),
+                        'last_seen': float(entry.get('last_seen', 0)),
+                        'last_match': int(entry['last_match']) if entry.get('last_match') else None
+                    }
+        except Exception as e:
+            logger.error(f"❌ Ошибка при получении реестра Ace Stream: {e}")
+        return channels
+    
+    def pack_channels(self, channels: Dict[str, str], match_id: Optional[int] = None) -> List:
+        """
+        Каналы матча для хранения: Ace Stream с названием из реестра -
+        только content ID, остальные - пары [название, url] (порядок сохраняется)
+        """
+        registered = self.register_ace_channels(channels, match_id)
+        entries = []
+        for title, url in channels.items():
+            content_id = self.ace_id(url)
+            entries.append(content_id if content_id is not None and registered.get(content_id) == title
+                           else [title, url])
+        return entries
+    
+    def unpack_channels(self, entries) -> Dict[str, str]:
+        """Словарь название -> url из хранимых каналов (см. pack_channels)"""
+        if isinstance(entries, dict):
+            # Снимок сохранен до появления реестра
+            return entries
+        registry = self.get_ace_channels([entry for entry in entries if isinstance(entry, str)])
+        channels = {}
+        for entry in entries:
+            if isinstance(entry, str):
+                # Запись реестра могла истечь раньше снимка
+                title = registry.get(entry, {}).get('title') or f'Ace Stream {entry[:8]}'
+                url = f'acestream://{entry}'
+            else:
+                title, url = entry
+            channels[title] = url
+        return channels
+    
+    def set_channels_snapshot(self, match_id: int, channels: Dict[str, str], version: Optional[int] = None,
+                              meta: Optional[Dict] = None,
+                              event: Optional[Tuple[str, Dict]] = None) -> Optional[Dict]:
+        """Сохранить снимок каналов матча со ссылками на реестр Ace Stream"""
+        snapshot = self.set_snapshot(
+            f'channels:{match_id}', self.pack_channels(channels, match_id), version, meta, event,
+            ttl=self.CHANNELS_SNAPSHOT_TTL
+        )
+        if snapshot is not None:
+            snapshot = dict(snapshot, data=channels)
+        return snapshot
+    
+    def get_channels_snapshot(self, match_id: int) -> Optional[Dict]:
+        """
+        Получить снимок каналов матча
+        
+        Returns:
+            Словарь {'data', 'updated_at', 'version', 'meta'} (data - название -> url) или None
+        """
+        snapshot = self.get_snapshot(f'channels:{match_id}')
+        if snapshot is None:
+            return None
+        # Тот же объект снимка - реестр уже раскрыт для этой версии
+        view = self._channel_views.get(match_id)
+        if view is None or view[0] is not snapshot:
+            view = snapshot, dict(snapshot, data=self.unpack_channels(snapshot['data']))
+        self._memo(self._channel_views, match_id, view)
+        return view[1]
+    
+    # ============ СНИМКИ ============
+    
+    @staticmethod
+    def _snapshot_stamp(snapshot: Dict) -> str:
+        """Метка снимка: меняется при каждой записи снимка"""
+        return repr(snapshot['updated_at'])
+    
+    def _memo(self, memo: OrderedDict, key, value):
+        """Запомнить значение в памяти процесса (не больше SNAPSHOT_MEMO_SIZE)"""
+        memo[key] = value
+        memo.move_to_end(key)
+        if len(memo) > self.SNAPSHOT_MEMO_SIZE:
+            memo.popitem(last=False)
+    
+    def set_snapshot(self, name: str, data, version: Optional[int] = None,
+                     meta: Optional[Dict] = None,
+                     event: Optional[Tuple[str, Dict]] = None,
+                     ttl: Optional[int] = None) -> Optional[Dict]:
+        """
+        Сохранить последний удачный снимок данных
+        
+        Снимок отдается клиентам сразу, даже если он устарел,
+        пока фоновое обновление не заменит его
+        
+        Args:
+            name: Имя снимка (например 'matches' или 'channels:<id>')
+            data: Данные
+            version: Версия последнего события изменения этих данных
+            meta: Служебные данные обновления (например трассировка парсера)
+            event: Изменение (тип, содержимое), которое публикуется вместе
+                со снимком; версия снимка - версия этого события
+            ttl: Время жизни снимка в Redis (None - без TTL)
+        
+        Returns:
+            Сохраненный снимок или None при ошибке
+        """
+        snapshot = {'data': data, 'updated_at': time.time(), 'version': version, 'meta': meta or {}}
+        try:
+            key = f'snapshot:{name}'
+            if event is not None:
+                snapshot['version'] = self.publish_event(*event, snapshot=(key, snapshot), snapshot_ttl=ttl)
+                if snapshot['version'] is None:
+                    return None
+            elif self.connected:
+                pipe = self.redis_client.pipeline()
+                pipe.set(key, json.dumps(snapshot, ensure_ascii=False), ex=ttl)
+                pipe.set(f'{key}:stamp', self._snapshot_stamp(snapshot), ex=ttl)
+                pipe.execute()
+            else:
+                self.local_cache[key] = snapshot
+            logger.info(f"💾 Снимок '{name}' сохранен")
+            return snapshot
+        except Exception as e:
+            logger.error(f"❌ Ошибка при сохранении снимка '{name}': {e}")
+            return None
+    
+    def get_snapshot(self, name: str) -> Optional[Dict]:
+        """
+        Получить снимок данных
+        
+        Разобранный снимок хранится в памяти процесса, пока метка снимка
+        в Redis не изменится: повторное чтение той же версии - один GET
+        короткого ключа без разбора JSON
+        
+        Returns:
+            Словарь {'data', 'updated_at', 'version', 'meta'} или None
+        """
+        try:
+            key = f'snapshot:{name}'
+            if self.connected:
+                # Метка читается до снимка: если снимок успеет смениться,
+                # следующее чтение увидит новую метку и перечитает его
+                stamp = self.redis_client.get(f'{key}:stamp')
+                cached = self._snapshots.get(name)
+                if stamp is not None and cached is not None and cached[0] == stamp:
+                    return cached[1]
+                data = self.redis_client.get(key)
+                snapshot = json.loads(data) if data else None
+                if snapshot is not None and stamp is not None:
+                    self._memo(self._snapshots, name, (stamp, snapshot))
+                return snapshot
+            return self.local_cache.get(key)
+        except Exception as e:
+            logger.error(f"❌ Ошибка при получении снимка '{name}': {e}")
+            return None
+    
+    def touch_active_match(self, match_key: str) -> bool:
+        """Отметить, что каналы матча недавно запрашивали"""
+        try:
+            if self.connected:
+                self.redis_client.zadd('active_matches', {match_key: time.time()})
+            else:
+                self.local_cache.setdefault('active_matches', {})[match_key] = time.time()
+            return True
+        except Exception as e:
+            logger.error(f"❌ Ошибка при отметке активного матча: {e}")
+            return False
+    
+    def get_active_matches(self, window: int) -> List[str]:
+        """
+        Матчи, каналы которых запрашивали за последние window секунд
+        
+        Более старые отметки удаляются
+        """
+        since = time.time() - window
+        try:
+            if self.connected:
+                self.redis_client.zremrangebyscore('active_matches', '-inf', since)
+                return list(self.redis_client.zrange('active_matches', 0, -1))
+            active = self.local_cache.setdefault('active_matches', {})
+            for match_key in [k for k, ts in active.items() if ts < since]:
+                del active[match_key]
+            return list(active)
+        except Exception as e:
+            logger.error(f"❌ Ошибка при получении активных матчей: {e}")
+            return []
+    
+    def acquire_lock(self, name: str, owner: str, ttl: int) -> bool:
+        """
+        Захватить или продлить блокировку
+        
+        Args:
+            name: Имя блокировки
+            owner: Идентификатор владельца
+            ttl: Время жизни в секундах
+        
+        Returns:
+            True если блокировка принадлежит owner
+        """
+        key = f'lock:{name}'
+        try:
+            if self.connected:
+                if self.redis_client.set(key, owner, nx=True, ex=ttl):
+                    return True
+                if self.redis_client.get(key) == owner:
+                    self.redis_client.expire(key, ttl)
+                    return True
+                return False
+            holder = self.local_cache.get(key)
+            if holder and holder[0] != owner and holder[1] > time.time():
+                return False
+            self.local_cache[key] = (owner, time.time() + ttl)
+            return True
+        except Exception as e:
+            logger.error(f"❌ Ошибка при захвате блокировки '{name}': {e}")
+            return False
+    
+    def release_lock(self, name: str, owner: str) -> bool:
+        """
+        Снять блокировку, если она принадлежит owner
+        
+        Returns:
+            True если блокировка снята
+        """
+        key = f'lock:{name}'
+        try:
+            if self.connected:
+                if self._release_script is None:
+                    self._release_script = self.redis_client.register_script(_RELEASE_LOCK_LUA)
+                return bool(self._release_script(keys=[key], args=[owner]))
+            holder = self.local_cache.get(key)
+            if holder and holder[0] == owner:
+                del self.local_cache[key]
+                return True
+            return False
+        except Exception as e:
+            logger.error(f"❌ Ошибка при снятии блокировки '{name}': {e}")
+            return False
+    
+    # ============ СОБЫТИЯ ИЗМЕНЕНИЙ ============
+    
+    def publish_event(self, event_type: str, data: Dict,
+                      snapshot: Optional[Tuple[str, Dict]] = None,
+                      snapshot_ttl: Optional[int] = None) -> Optional[int]:
+        """
+        Опубликовать событие изменения с новой версией
+        
+        Событие попадает в stream (чтение с любой версии) и рассылается
+        через pub/sub (подписчики в реальном времени)
+        
+        Args:
+            event_type: Тип события ('matches' или 'channels')
+            data: Содержимое изменения
+            snapshot: Ключ и снимок, который сохраняется с версией события
+                в той же операции (см. set_snapshot)
+            snapshot_ttl: Время жизни снимка (None - без TTL)
+        
+        Returns:
+            Версия события или None при ошибке
+        """
+        try:
+            payload = json.dumps(data, ensure_ascii=False)
+            if self.connected:
+                if self._publish_script is None:
+                    self._publish_script = self.redis_client.register_script(_PUBLISH_EVENT_LUA)
+                keys = ['events:version', self.EVENTS_STREAM]
+                args = [event_type, payload, time.time(), self.EVENTS_MAXLEN]
+                if snapshot is not None:
+                    key, body = snapshot
+                    stamp = self._snapshot_stamp(body)
+                    body = {field: value for field, value in body.items() if field != 'version'}
+                    keys += [key, f'{key}:stamp']
+                    args += [json.dumps(body, ensure_ascii=False)[1:], stamp, snapshot_ttl or 0]
+                version = int(self._publish_script(keys=keys, args=args))
+            else:
+                events = self.local_cache.setdefault(self.EVENTS_STREAM, [])
+                version = self.local_cache.get('events:version', 0) + 1
+                self.local_cache['events:version'] = version
+                if snapshot is not None:
+                    key, body = snapshot
+                    self.local_cache[key] = dict(body, version=version)
+                events.append({'version': version, 'type': event_type, 'ts': time.time(), 'data': data})
+                del events[:-self.EVENTS_MAXLEN]
+            logger.info(f"📣 Событие '{event_type}' опубликовано (версия {version})")
+            return version
+        except Exception as e:
+            logger.error(f"❌ Ошибка при публикации события '{event_type}': {e}")
+            return None
+    
+    def get_events(self, since: int, limit: int = 100) -> List[Dict]:
+        """
+        События с версией больше since (по возрастанию версии)
+        
+        Args:
+            since: Последняя версия, которую уже видел клиент
+            limit: Максимум событий
+        """
+        try:
+            if self.connected:
+                entries = self.redis_client.xrange(self.EVENTS_STREAM, min=f'{since + 1}-0', max='+', count=limit)
+                return [json.loads(fields['event']) for _, fields in entries]
+            events = self.local_cache.get(self.EVENTS_STREAM, [])
+            return [event for event in events if event['version'] > since][:limit]
+        except Exception as e:
+            logger.error(f"❌ Ошибка при получении событий: {e}")
+            return []
+    
+    def get_event_version(self) -> int:
+        """Версия последнего опубликованного события"""
+        try:
+            if self.connected:
+                return int(self.redis_client.get('events:version') or 0)
+            return self.local_cache.get('events:version', 0)
+        except Exception as e:
+            logger.error(f"❌ Ошибка при получении версии событий: {e}")
+            return 0
+    
+    # ============ ДОСТУПНОСТЬ ССЫЛОК ============
+    
+    @staticmethod
+    def canonical_url(url: str) -> str:
+        """
+        Канонический вид URL для ключа кэша
+        
+        Схема и хост в нижнем регистре, без порта по умолчанию,
+        без фрагмента, параметры запроса отсортированы
+        """
+        parts = urlsplit(url.strip())
+        scheme = parts.scheme.lower()
+        host = (parts.hostname or '').lower()
+        port = parts.port
+        if port and not (scheme == 'http' and port == 80) and not (scheme == 'https' and port == 443):
+            host = f'{host}:{port}'
+        query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+        return urlunsplit((scheme, host, parts.path or '/', query, ''))
+    
+    def _link_key(self, url: str) -> str:
+        digest = hashlib.sha1(self.canonical_url(url).encode('utf-8')).hexdigest()
+        return f'link_status:{digest}'
+    
+    def get_link_statuses(self, urls: List[str]) -> Dict[str, bool]:
+        """
+        Получить закэшированные статусы доступности ссылок
+        
+        Args:
+            urls: Список URL
+        
+        Returns:
+            Словарь url -> bool только для найденных в кэше URL
+        """
+        statuses = {}
+        if not urls:
+            return statuses
+        try:
+            keys = [self._link_key(url) for url in urls]
+            if self.connected:
+                values = self.redis_client.mget(keys)
+            else:
+                now = time.time()
+                values = []
+                for key in keys:
+                    entry = self.local_cache.get(key)
+                    values.append(entry[0] if entry and entry[1] > now else None)
+            
+            for url, value in zip(urls, values):
+                if value is not None:
+                    statuses[url] = value == '1'
+            self._count_link_lookups(len(statuses), len(urls) - len(statuses))
+        except Exception as e:
+            logger.error(f"❌ Ошибка при получении статусов ссылок: {e}")
+        
+        return statuses
+    
+    def set_link_statuses(self, statuses: Dict[str, bool],
+                          alive_ttl: Optional[int] = None, dead_ttl: Optional[int] = None) -> bool:
+        """
+        Сохранить статусы доступности ссылок
+        
+        Args:
+            statuses: Словарь url -> bool
+            alive_ttl: TTL для доступных ссылок (по умолчанию LINK_ALIVE_TTL)
+            dead_ttl: TTL для недоступных ссылок (по умолчанию LINK_DEAD_TTL)
+        
+        Returns:
+            True если успешно
+        """
+        if not statuses:
+            return True
+        alive_ttl = alive_ttl or self.LINK_ALIVE_TTL
+        dead_ttl = dead_ttl or self.LINK_DEAD_TTL
+        try:
+            if self.connected:
+                pipe = self.redis_client.pipeline(transaction=False)
+                for url, alive in statuses.items():
+                    pipe.setex(self._link_key(url), alive_ttl if alive else dead_ttl, '1' if alive else '0')
+                pipe.execute()
+            else:
+                now = time.time()
+                for url, alive in statuses.items():
+                    ttl = alive_ttl if alive else dead_ttl
+                    self.local_cache[self._link_key(url)] = ('1' if alive else '0', now + ttl)
+            return True
+        except Exception as e:
+            logger.error(f"❌ Ошибка при сохранении статусов ссылок: {e}")
+            return False
+    
+    def _count_link_lookups(self, hits: int, misses: int):
+        """Учесть попадания и промахи кэша статусов (общие счетчики в Redis)"""
+        self.link_stats['hits'] += hits
+        self.link_stats['misses'] += misses
+        if self.connected:
+            pipe = self.redis_client.pipeline(transaction=False)
+            if hits:
+                pipe.hincrby('stats:link_status', 'hits', hits)
+            if misses:
+                pipe.hincrby('stats:link_status', 'misses', misses)
+            pipe.execute()
+    
+    def get_link_status_stats(self) -> Dict:
+        """Счетчики попаданий и промахов кэша статусов ссылок"""
+        try:
+            if self.connected:
+                data = self.redis_client.hgetall('stats:link_status')
+                hits = int(data.get('hits', 0))
+                misses = int(data.get('misses', 0))
+            else:
+                hits = self.link_stats['hits']
+                misses = self.link_stats['misses']
+            total = hits + misses
+            return {
+                'hits': hits,
+                'misses': misses,
+                'hit_rate': round(hits / total, 3) if total else 0.0
+            }
+        except Exception as e:
+            logger.error(f"❌ Ошибка при получении счетчиков ссылок: {e}")
+            return {'hits': 0, 'misses': 0, 'hit_rate': 0.0}
+    
     # ============ ИЗБРАННЫЕ МАТЧИ ============
     
     def add_favorite(self, user_id: int, match_id: int) -> bool:
@@ -390,12 +967,14 @@ class RedisCache:
                 return {
                     'used_memory': info.get('used_memory_human', 'N/A'),
                     'used_memory_peak': info.get('used_memory_peak_human', 'N/A'),
+                    'link_status': self.get_link_status_stats(),
                     'connected': True,
                     'type': 'Redis'
                 }
             else:
                 return {
                     'items': len(self.local_cache),
+                    'link_status': self.get_link_status_stats(),
                     'connected': False,
                     'type': 'Local'
                 }
@@ -411,7 +990,11 @@ def get_cache() -> RedisCache:
     """Получить глобальный экземпляр кэша"""
     global _cache
     if _cache is None:
-        _cache = RedisCache()
+        _cache = RedisCache(
+            host=os.getenv('REDIS_HOST', 'localhost'),
+            port=int(os.getenv('REDIS_PORT', '6379')),
+            password=os.getenv('REDIS_PASSWORD') or None
+        )
     return _cache
 
 if __name__ == "__main__":
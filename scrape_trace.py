@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Трассировка парсинга gooool365
+Длительность каждого этапа, объем загруженных данных, число кандидатов
+и исходы проверки ссылок для одного вызова парсера. Значения сразу
+попадают в гистограммы Prometheus и сохраняются вместе с результатом
+"""
+
+import time
+from contextlib import contextmanager
+from typing import Dict, List
+
+from prometheus_client import Counter, Histogram
+
+STAGE_SECONDS = Histogram(
+    'futlive_parser_stage_seconds', 'Длительность этапов парсинга',
+    ['operation', 'stage'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20)
+)
+TOTAL_SECONDS = Histogram(
+    'futlive_parser_duration_seconds', 'Полное время вызова парсера',
+    ['operation'],
+    buckets=(0.1, 0.25, 0.5, 1, 2, 4, 8, 12, 20, 30)
+)
+DOWNLOADED_BYTES = Histogram(
+    'futlive_parser_downloaded_bytes', 'Загружено байт за вызов парсера',
+    ['operation'],
+    buckets=(0, 1024, 8192, 32768, 131072, 524288, 2097152)
+)
+CANDIDATES = Histogram(
+    'futlive_parser_candidates', 'Кандидатов в ссылки за вызов по источнику',
+    ['source'],
+    buckets=(0, 1, 2, 4, 8, 16, 32, 64)
+)
+VALIDATIONS = Counter(
+    'futlive_parser_validations_total', 'Исходы проверки ссылок',
+    ['outcome']
+)
+TRUNCATED_BODIES = Counter(
+    'futlive_parser_truncated_bodies_total', 'Ответы, дочитанные не до конца',
+    ['reason']
+)
+
+
+class ScrapeTrace:
+    """Замеры одного вызова парсера"""
+
+    # Исходы проверки ссылок: из кэша, доступна, недоступна,
+    # не успела до дедлайна, пропущена circuit breaker'ом
+    OUTCOMES = ('cached', 'alive', 'dead', 'timeout', 'skipped')
+
+    def __init__(self, operation: str):
+        """
+        Args:
+            operation: Что парсим ('matches' или 'links')
+        """
+        self.operation = operation
+        self.started = time.monotonic()
+        self.stages: Dict[str, float] = {}
+        self.bytes = 0
+        self.candidates: Dict[str, int] = {}
+        self.validation = dict.fromkeys(self.OUTCOMES, 0)
+        self.duration = None
+        self.result_count = None
+
+    @contextmanager
+    def stage(self, name: str):
+        """Замерить этап (повторные замеры одного этапа суммируются)"""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed
+            STAGE_SECONDS.labels(self.operation, name).observe(elapsed)
+
+    def timed(self, name: str, func):
+        """Функция, каждый вызов которой замеряется как этап name"""
+        def wrapper(*args, **kwargs):
+            with self.stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+
+    async def measure(self, name: str, awaitable):
+        """Дождаться awaitable, замерив ожидание как этап name"""
+        with self.stage(name):
+            return await awaitable
+
+    def add_bytes(self, size: int):
+        """Учесть загруженное тело ответа"""
+        self.bytes += size
+
+    def add_candidates(self, candidates: List[Dict]):
+        """Учесть кандидатов по источнику"""
+        for candidate in candidates:
+            source = candidate.get('source', 'unknown')
+            self.candidates[source] = self.candidates.get(source, 0) + 1
+
+    def add_validation(self, outcome: str, count: int = 1):
+        """Учесть исход проверки ссылок"""
+        if count:
+            self.validation[outcome] += count
+            VALIDATIONS.labels(outcome).inc(count)
+
+    def add_probes(self, cached: int, results: List, timed_out: int):
+        """
+        Учесть проверку пачки ссылок
+
+        Args:
+            cached: Сколько статусов взято из кэша
+            results: Результаты проверок (True, False или None - пропущена)
+            timed_out: Сколько проверок не успело до дедлайна
+        """
+        self.add_validation('cached', cached)
+        self.add_validation('alive', sum(1 for result in results if result is True))
+        self.add_validation('dead', sum(1 for result in results if result is False))
+        self.add_validation('skipped', sum(1 for result in results if result is None))
+        self.add_validation('timeout', timed_out)
+
+    def finish(self, result_count: int):
+        """Завершить трассировку и выгрузить итоговые метрики"""
+        self.duration = time.monotonic() - self.started
+        self.result_count = result_count
+        TOTAL_SECONDS.labels(self.operation).observe(self.duration)
+        DOWNLOADED_BYTES.labels(self.operation).observe(self.bytes)
+        for source, count in self.candidates.items():
+            CANDIDATES.labels(source).observe(count)
+
+    def to_dict(self) -> Dict:
+        """Трассировка для сохранения вместе с результатом"""
+        return {
+            'operation': self.operation,
+            'duration': round(self.duration, 4) if self.duration is not None else None,
+            'stages': {name: round(elapsed, 4) for name, elapsed in self.stages.items()},
+            'bytes': self.bytes,
+            'candidates': dict(self.candidates),
+            'validation': dict(self.validation),
+            'result_count': self.result_count
+        }
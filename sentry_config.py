@@ -6,8 +6,13 @@ import os
 import sentry_sdk
 from sentry_sdk.integrations.flask import FlaskIntegration
 
-def init_sentry():
-    """Инициализация Sentry для отслеживания ошибок"""
+def init_sentry(integrations=None):
+    """
+    Инициализация Sentry для отслеживания ошибок
+
+    Args:
+        integrations: Интеграции Sentry (по умолчанию для Flask)
+    """
     sentry_dsn = os.getenv('SENTRY_DSN')
     
     if not sentry_dsn:
@@ -16,7 +21,7 @@ def init_sentry():
     
     sentry_sdk.init(
         dsn=sentry_dsn,
-        integrations=[FlaskIntegration()],
+        integrations=integrations or [FlaskIntegration()],
         traces_sample_rate=0.1,  # 10% транзакций для трассировки
         environment=os.getenv('FLASK_ENV', 'production'),
         release=os.getenv('APP_VERSION', '1.0.0'),
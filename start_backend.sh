@@ -1,8 +1,25 @@
 #!/bin/bash
 
-# Запуск API сервера через Gunicorn для production
-echo "🚀 Запуск API сервера..."
-gunicorn --bind 0.0.0.0:5000 --workers 3 --timeout 120 api_server:app &
+# Режим API сервера: asgi (Quart + Uvicorn) или wsgi (Flask + Gunicorn).
+# Поток событий /api/stream (SSE) есть только в asgi, в wsgi клиенты
+# получают изменения опросом /api/events
+API_SERVER_MODE=${API_SERVER_MODE:-asgi}
+
+# Общий каталог метрик Prometheus для воркеров и бота: /metrics любого
+# воркера отдает сумму по всем процессам (очищается при каждом запуске)
+export PROMETHEUS_MULTIPROC_DIR=${PROMETHEUS_MULTIPROC_DIR:-/tmp/futlive_metrics}
+rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
+if [ "$API_SERVER_MODE" = "asgi" ]; then
+    # Асинхронный режим: медленные запросы каналов не занимают воркер
+    echo "🚀 Запуск API сервера (ASGI)..."
+    uvicorn api_server_asgi:app --host 0.0.0.0 --port 5000 --workers ${API_WORKERS:-2} &
+else
+    # Запуск API сервера через Gunicorn для production
+    echo "🚀 Запуск API сервера..."
+    gunicorn --bind 0.0.0.0:5000 --workers ${API_WORKERS:-3} --timeout 120 api_server:app &
+fi
 
 # Запуск Telegram бота
 echo "🤖 Запуск Telegram бота..."